@@ -7,39 +7,248 @@ Anilist API Client
 A simple client for testing the Anilist GraphQL API.
 """
 
-import json
-import requests
-from typing import Dict, Any, Optional, List
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+from cache import ResponseCache, CacheEntry, content_hash, request_key
+from rate_limit import TokenBucket
+from scheduler import PriorityScheduler, INTERACTIVE, BULK
+from similarity import MediaSimilarityIndex
+from transport import transport_from_env
 
 
 class AnilistClient:
     """A client for the Anilist GraphQL API."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        similarity_index: Optional[MediaSimilarityIndex] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        cache: Optional[ResponseCache] = None,
+        pool_size: int = 10,
+        transport=None,
+        scheduler: Optional[PriorityScheduler] = None,
+        priority: str = INTERACTIVE,
+    ):
         self.url = "https://graphql.anilist.co"
         self.headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
+        # HttpTransport, RecordingTransport or ReplayTransport; see transport.py.
+        self.transport = transport if transport is not None else transport_from_env(pool_size)
+        self.similarity_index = (
+            similarity_index if similarity_index is not None else MediaSimilarityIndex()
+        )
+        self.rate_limiter = rate_limiter
+        # With a scheduler, requests queue in the `priority` lane instead of
+        # waiting on `rate_limiter` directly.
+        self.scheduler = scheduler
+        self.priority = priority
+        self.cache = cache
+        self._hot_refresher_stop: Optional[threading.Event] = None
 
-    def run_query(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def run_query(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        priority: Optional[str] = None,
+        cache: bool = True,
+    ) -> Dict[str, Any]:
         """
         Execute a GraphQL query against the Anilist API.
 
+        If the client has a cache, a fresh cached result is returned without a
+        request and a stale one is revalidated. With stale-while-revalidate
+        enabled, a recently expired result is returned immediately and
+        refreshed in a background thread instead. Concurrent callers missing
+        the same key wait for a single request instead of each sending one.
+
         Args:
             query: The GraphQL query string
             variables: Optional variables for the query
+            priority: Scheduler lane for this request (default: the client's `priority`)
+            cache: Whether to use the client's cache; bulk callers that fetch
+                each query once pass False to keep it from evicting hot entries
 
         Returns:
             The JSON response from the API
         """
+        if self.cache is None or not cache:
+            return self._fetch(query, variables, priority=priority)[0]
+
+        key = request_key(query, variables)
+        self.cache.record_access(key, query, variables)
+        entry = self.cache.get(key)
+        if entry is not None:
+            now = time.time()
+            if self.cache.is_fresh(entry, now):
+                return entry.data
+            if self.cache.is_servable_stale(entry, now):
+                self._refresh_in_background(query, variables, key)
+                return entry.data
+
+        while not self.cache.begin_refresh(key):
+            self.cache.wait_refresh(key)
+            entry = self.cache.get(key)
+            if entry is not None and self.cache.is_fresh(entry):
+                return entry.data
+        try:
+            return self._fetch(query, variables, key, entry, priority)[0]
+        finally:
+            self.cache.end_refresh(key)
+
+    def _refresh_in_background(self, query: str, variables: Optional[Dict[str, Any]], key: str) -> bool:
+        if not self.cache.begin_refresh(key):
+            return False
+
+        def refresh():
+            try:
+                # Background refreshes never compete with callers that are waiting.
+                self._fetch(query, variables, key, self.cache.get(key), BULK)
+            except Exception:
+                pass  # The stale entry stays in place; the next access retries.
+            finally:
+                self.cache.end_refresh(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+        return True
+
+    def refresh_hot(self, n: int = 20, refresh_ahead: float = 60) -> int:
+        """
+        Proactively refresh the most frequently accessed cached results.
+
+        Only entries that expire within `refresh_ahead` seconds (or already
+        have) are refreshed, each in a background thread.
+
+        Args:
+            n: Number of hottest keys to consider (default: 20)
+            refresh_ahead: Seconds before expiry an entry becomes due (default: 60)
+
+        Returns:
+            Number of refreshes started
+        """
+        if self.cache is None:
+            return 0
+        started = 0
+        now = time.time()
+        for key, query, variables in self.cache.hottest(n):
+            entry = self.cache.get(key)
+            if entry is None or entry.stored_at + self.cache.ttl - refresh_ahead <= now:
+                started += self._refresh_in_background(query, variables, key)
+        return started
+
+    def start_hot_refresher(self, n: int = 20, interval: float = 30, refresh_ahead: float = 60) -> None:
+        """
+        Run `refresh_hot` every `interval` seconds in a daemon thread.
+
+        Args:
+            n: Number of hottest keys to consider (default: 20)
+            interval: Seconds between refresh cycles (default: 30)
+            refresh_ahead: Seconds before expiry an entry becomes due (default: 60)
+        """
+        self.stop_hot_refresher()
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.refresh_hot(n, refresh_ahead)
+
+        self._hot_refresher_stop = stop
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop_hot_refresher(self) -> None:
+        """Stop the thread started by `start_hot_refresher`, if any."""
+        if self._hot_refresher_stop is not None:
+            self._hot_refresher_stop.set()
+            self._hot_refresher_stop = None
+
+    def refresh(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        priority: Optional[str] = None,
+        cache: bool = True,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Revalidate a cached result regardless of its age.
+
+        The cached ETag / Last-Modified validators are sent with the request,
+        and a response whose body hashes to the cached content hash is not
+        decoded again.
+
+        Args:
+            query: The GraphQL query string
+            variables: Optional variables for the query
+            priority: Scheduler lane for this request (default: the client's `priority`)
+            cache: Whether to use the client's cache (see `run_query`)
+
+        Returns:
+            The JSON response and whether its content changed
+        """
+        if self.cache is None or not cache:
+            return self._fetch(query, variables, priority=priority)[0], True
+        key = request_key(query, variables)
+        return self._fetch(query, variables, key, self.cache.get(key), priority)
+
+    def _fetch(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        key: Optional[str] = None,
+        entry: Optional[CacheEntry] = None,
+        priority: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
         payload = {"query": query}
         if variables:
             payload["variables"] = variables
 
-        response = requests.post(self.url, json=payload, headers=self.headers)
+        headers = self.headers
+        if entry is not None and (entry.etag or entry.last_modified):
+            headers = dict(self.headers)
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        if self.scheduler is not None:
+            self.scheduler.acquire(priority or self.priority)
+        elif self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        response = self.transport.post(self.url, payload, headers)
+
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if entry is not None and response.status_code == 304:
+            self.cache.touch(key, etag, last_modified)
+            return entry.data, False
+
         response.raise_for_status()  # Raise an exception for HTTP errors
-        return response.json()
+        if key is None:  # Uncached request
+            return response.json(), True
+
+        body_hash = content_hash(response.content)
+        if entry is not None and entry.content_hash == body_hash:
+            self.cache.touch(key, etag, last_modified)
+            return entry.data, False
+
+        result = response.json()
+        if "errors" in result:
+            return result, True
+        self.cache.put(key, result, body_hash, etag, last_modified)
+        return result, True
+
+    def transfer_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get request and response byte counts per GraphQL operation.
+
+        Returns:
+            Dict of operation name to byte counts, compressed ("wire") and
+            uncompressed; empty if the transport does not keep statistics
+        """
+        stats = getattr(self.transport, "stats", None)
+        return stats.snapshot() if stats is not None else {}
 
     def get_anime_by_id(self, anime_id: int) -> Dict[str, Any]:
         """
@@ -200,6 +409,30 @@ class AnilistClient:
         }
         return self.run_query(query, variables)
 
+    def similar(self, media_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Get the anime most similar to the given one by genres, tags and score.
+
+        Candidates are the media added to `similarity_index`. The target anime
+        is fetched with `get_anime_by_id` and indexed if it is not present yet.
+
+        Args:
+            media_id: The Anilist ID of the anime
+            k: Number of similar anime to return (default: 10)
+
+        Returns:
+            List of (media ID, cosine similarity) pairs, most similar first
+        """
+        if media_id not in self.similarity_index:
+            result = self.get_anime_by_id(media_id)
+            if "errors" in result:
+                raise ValueError(result["errors"][0]["message"])
+            media = (result.get("data") or {}).get("Media")
+            if media is None:
+                raise KeyError(f"Media {media_id} not found")
+            self.similarity_index.add(media)
+        return self.similarity_index.similar(media_id, k)
+
 
 # This space intentionally left empty after removing the print_anime_info function
 # The formatting functionality has been moved to the AnimeFormatter class in main.py
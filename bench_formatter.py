@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+AnimeFormatter Microbenchmark
+
+Compares the original `format_anime_details` implementation (wrap the whole
+description, chained str.replace, full tag sort) with the current one, and
+measures `AnimeFormatter.render_bulk` on synthetic Media objects.
+"""
+
+import io
+import random
+import textwrap
+import argparse
+import timeit
+
+from main import AnimeFormatter
+
+
+def reference_format_anime_details(anime):
+    """The original AnimeFormatter.format_anime_details, kept as a baseline."""
+    title = anime["title"]
+    info = [
+        f"📺 {title['romaji']} ({anime['id']})",
+        f"   {title.get('native', '')}"
+    ]
+    if title.get("english"):
+        info.append(f"   English: {title['english']}")
+    if anime.get("description"):
+        description = anime["description"].replace("<br>", " ").replace("<i>", "").replace("</i>", "")
+        wrapped_desc = textwrap.fill(description, width=80)[:300]
+        if len(description) > 300:
+            wrapped_desc += "..."
+        info.append(f"\n📝 {wrapped_desc}")
+    details = []
+    if anime.get("episodes"):
+        details.append(f"Episodes: {anime['episodes']}")
+    if anime.get("duration"):
+        details.append(f"Duration: {anime['duration']}min")
+    if anime.get("status"):
+        details.append(f"Status: {anime['status']}")
+    if details:
+        info.append("\n🔍 " + " | ".join(details))
+    dates = []
+    if anime.get("startDate") and anime["startDate"].get("year"):
+        start = anime["startDate"]
+        dates.append(f"Start: {start.get('year')}-{start.get('month', '??')}-{start.get('day', '??')}")
+    if anime.get("endDate") and anime["endDate"].get("year"):
+        end = anime["endDate"]
+        dates.append(f"End: {end.get('year')}-{end.get('month', '??')}-{end.get('day', '??')}")
+    if dates:
+        info.append("📅 " + " | ".join(dates))
+    if anime.get("season") or anime.get("format"):
+        season_format = []
+        if anime.get("season") and anime.get("seasonYear"):
+            season_format.append(f"{anime['season']} {anime['seasonYear']}")
+        if anime.get("format"):
+            season_format.append(anime["format"])
+        info.append("🗓️ " + " | ".join(season_format))
+    if anime.get("genres"):
+        info.append(f"🏷️ {', '.join(anime['genres'][:5])}")
+    if anime.get("tags"):
+        top_tags = sorted(anime["tags"], key=lambda x: x["rank"], reverse=True)[:3]
+        info.append(f"🔖 {', '.join(tag['name'] for tag in top_tags)}")
+    ratings = []
+    if anime.get("averageScore"):
+        ratings.append(f"Score: {anime['averageScore']}/100")
+    if anime.get("popularity"):
+        ratings.append(f"Popularity: {anime['popularity']}")
+    if ratings:
+        info.append("⭐ " + " | ".join(ratings))
+    if anime.get("studios") and anime["studios"].get("nodes"):
+        studios = [studio["name"] for studio in anime["studios"]["nodes"]]
+        info.append(f"🏢 {', '.join(studios)}")
+    return "\n".join(info)
+
+
+def make_media(count, seed=0):
+    """Build synthetic Media objects shaped like `get_anime_by_id` results."""
+    rnd = random.Random(seed)
+    words = ["the", "hero", "journey", "village", "demon", "sword", "friendship", "battle", "<i>Kimetsu</i>", "<br>"]
+    media = []
+    for media_id in range(count):
+        media.append({
+            "id": media_id,
+            "title": {"romaji": f"Anime {media_id}", "english": f"Anime {media_id}", "native": "アニメ"},
+            "description": " ".join(rnd.choice(words) for _ in range(rnd.randint(80, 400))),
+            "episodes": 26,
+            "duration": 24,
+            "status": "FINISHED",
+            "startDate": {"year": 2019, "month": 4, "day": 6},
+            "endDate": {"year": 2019, "month": 9, "day": 28},
+            "season": "SPRING",
+            "seasonYear": 2019,
+            "format": "TV",
+            "genres": ["Action", "Adventure", "Drama", "Fantasy", "Supernatural"],
+            "tags": [{"name": f"Tag {i}", "rank": rnd.randint(1, 100)} for i in range(rnd.randint(10, 40))],
+            "averageScore": 84,
+            "popularity": 700000,
+            "studios": {"nodes": [{"name": "ufotable"}]},
+        })
+    return media
+
+
+def main():
+    """Main function to run the formatter benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark AnimeFormatter rendering')
+    parser.add_argument('-n', '--count', type=int, default=2000, help='Number of synthetic media')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Timing repetitions (best is reported)')
+    args = parser.parse_args()
+
+    media = make_media(args.count)
+    assert all(reference_format_anime_details(anime) == AnimeFormatter.format_anime_details(anime) for anime in media)
+
+    def run_reference():
+        for anime in media:
+            reference_format_anime_details(anime)
+
+    def run_current():
+        for anime in media:
+            AnimeFormatter.format_anime_details(anime)
+
+    def run_bulk():
+        AnimeFormatter.render_bulk(media, io.StringIO(), detailed=True)
+
+    results = {}
+    for name, func in [("reference", run_reference), ("format_anime_details", run_current), ("render_bulk", run_bulk)]:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        results[name] = best
+        print(f"{name:>22}: {args.count / best:10.0f} media/s")
+
+    print(f"{'speedup':>22}: {results['reference'] / results['render_bulk']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
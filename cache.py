@@ -0,0 +1,602 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Anilist API Response Cache
+
+Caches query results together with a content hash of the raw response body
+and any HTTP validators (ETag / Last-Modified), so that refreshing an entry
+whose payload did not change skips decoding and downstream processing.
+"""
+
+import json
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+def request_key(query: str, variables: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build a stable key identifying a query and its variables.
+
+    Args:
+        query: The GraphQL query string
+        variables: Optional variables for the query
+
+    Returns:
+        Hex digest of the whitespace-normalised query and the sorted variables
+    """
+    normalized = " ".join(query.split())
+    encoded = json.dumps([normalized, variables or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def content_hash(body: bytes) -> str:
+    """Hash a raw response body."""
+    return hashlib.sha256(body).hexdigest()
+
+
+class CacheEntry(NamedTuple):
+    """A cached query result."""
+
+    data: Dict[str, Any]
+    content_hash: str
+    stored_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class MemoryStore:
+    """A thread-safe in-process dictionary store for cache entries."""
+
+    def __init__(self):
+        self._entries: Dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def content_hash(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.content_hash if entry is not None else None
+
+    def touch(
+        self, key: str, stored_at: float, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            self._entries[key] = entry._replace(
+                stored_at=stored_at,
+                etag=etag or entry.etag,
+                last_modified=last_modified or entry.last_modified,
+            )
+            return True
+
+    def keys(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+
+
+class LRUStore:
+    """A thread-safe in-process store holding at most `max_entries` entries."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def content_hash(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.content_hash if entry is not None else None
+
+    def touch(
+        self, key: str, stored_at: float, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            self._entries[key] = entry._replace(
+                stored_at=stored_at,
+                etag=etag or entry.etag,
+                last_modified=last_modified or entry.last_modified,
+            )
+            return True
+
+    def keys(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+
+
+class SharedStore:
+    """
+    A cache store shared by every process on the host.
+
+    Entries live in a SQLite file opened in WAL mode with memory-mapped I/O, so
+    processes read the same page cache instead of each fetching and holding
+    their own copies. Every write or delete is also appended to an
+    invalidation log that other processes use to drop stale in-process copies.
+
+    With LRU eviction, access times are collected in process and written in
+    batches, on the next `set` or once every `access_flush_size` reads, so
+    LRU order is approximate and most reads do not write.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        eviction: str = "lru",
+        mmap_size: int = 256 * 1024 * 1024,
+        access_flush_size: int = 256,
+        keep_invalidations: int = 10000,
+    ):
+        """
+        Args:
+            path: SQLite database file
+            max_bytes: Maximum total size of stored results (default: 256 MiB)
+            eviction: "lru" evicts the least recently read entries, "fifo" the
+                oldest written ones (default: "lru")
+            mmap_size: Bytes of the file SQLite maps into memory (default: 256 MiB)
+            access_flush_size: Reads buffered before their access times are
+                written; pending access times are also written with every
+                `set` (default: 256)
+            keep_invalidations: Invalidation records kept when the log is
+                compacted, which happens every `keep_invalidations` writes
+                (default: 10000)
+        """
+        if eviction not in ("lru", "fifo"):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.access_flush_size = access_flush_size
+        self.keep_invalidations = keep_invalidations
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._accesses: Dict[str, float] = {}
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+            CREATE INDEX IF NOT EXISTS entries_stored_at ON entries (stored_at);
+            CREATE TABLE IF NOT EXISTS invalidations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO stats
+                SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM entries;
+            """
+        )
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block in one write transaction, rolling it back if the block raises."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, content_hash, stored_at, etag, last_modified FROM entries WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if self.eviction == "lru":
+                self._accesses[key] = time.time()
+                if len(self._accesses) >= self.access_flush_size:
+                    with self._transaction():
+                        self._flush_accesses()
+        data, body_hash, stored_at, etag, last_modified = row
+        return CacheEntry(json.loads(data), body_hash, stored_at, etag, last_modified)
+
+    def flush_accesses(self) -> None:
+        """Write buffered access times now."""
+        with self._lock:
+            if self._accesses:
+                with self._transaction():
+                    self._flush_accesses()
+
+    def _flush_accesses(self) -> None:
+        """Write buffered access times. Requires `_lock` and an open transaction."""
+        if self._accesses:
+            self._conn.executemany(
+                "UPDATE entries SET accessed_at = ? WHERE key = ? AND accessed_at < ?",
+                [(accessed_at, key, accessed_at) for key, accessed_at in self._accesses.items()],
+            )
+            self._accesses.clear()
+
+    def _add_bytes(self, delta: int) -> int:
+        """Adjust and return the running total of stored bytes. Requires an open transaction."""
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'total_bytes'", (delta,))
+        return self._conn.execute("SELECT value FROM stats WHERE name = 'total_bytes'").fetchone()[0]
+
+    def _size_of(self, key: str) -> int:
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        data = json.dumps(entry.data, ensure_ascii=False, separators=(",", ":"))
+        size = len(data.encode("utf-8"))
+        with self._lock:
+            with self._transaction():
+                self._flush_accesses()
+                total = self._add_bytes(size - self._size_of(key))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key, data, entry.content_hash, entry.stored_at,
+                        entry.etag, entry.last_modified, size, time.time(),
+                    ),
+                )
+                self._conn.execute("INSERT INTO invalidations (key) VALUES (?)", (key,))
+                if total > self.max_bytes:
+                    self._evict(total)
+            self._writes += 1
+            if self._writes % self.keep_invalidations == 0:
+                self._compact_invalidations(self.keep_invalidations)
+
+    def _evict(self, total: int) -> None:
+        """Delete entries until at most `max_bytes` remain. Requires an open transaction."""
+        order = "accessed_at" if self.eviction == "lru" else "stored_at"
+        evicted = []
+        freed = 0
+        for key, size in self._conn.execute(f"SELECT key, size FROM entries ORDER BY {order}"):
+            if total - freed <= self.max_bytes:
+                break
+            evicted.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._conn.executemany("INSERT INTO invalidations (key) VALUES (?)", evicted)
+        self._add_bytes(-freed)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._accesses.pop(key, None)
+            with self._transaction():
+                self._add_bytes(-self._size_of(key))
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.execute("INSERT INTO invalidations (key) VALUES (?)", (key,))
+
+    def content_hash(self, key: str) -> Optional[str]:
+        """Get an entry's content hash without decoding its data."""
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def touch(
+        self, key: str, stored_at: float, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> bool:
+        """
+        Renew an entry's timestamp and validators in place.
+
+        The data is unchanged, so no invalidation is logged and other
+        processes keep their decoded copies.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE entries SET stored_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (stored_at, etag, last_modified, key),
+            )
+            return cursor.rowcount > 0
+
+    def keys(self) -> Iterator[str]:
+        with self._lock:
+            return iter([key for (key,) in self._conn.execute("SELECT key FROM entries")])
+
+    def data_version(self) -> int:
+        """A number that changes whenever another connection commits a write."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def invalidation_seq(self) -> int:
+        """The sequence number of the latest invalidation record (0 if there is none)."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+
+    def invalidations_since(self, seq: int) -> Tuple[int, Optional[List[str]]]:
+        """
+        Get the keys written or deleted after invalidation `seq`.
+
+        Returns:
+            The latest sequence number and the invalidated keys, or None
+            instead of the keys if records after `seq` were already compacted
+            away and the caller must treat every key as invalidated
+        """
+        with self._lock:
+            (first,) = self._conn.execute("SELECT MIN(seq) FROM invalidations").fetchone()
+            rows = self._conn.execute(
+                "SELECT seq, key FROM invalidations WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        if not rows:
+            return seq, []
+        if first is not None and first > seq + 1:
+            return rows[-1][0], None
+        return rows[-1][0], [key for _, key in rows]
+
+    def compact_invalidations(self, keep: int = 10000) -> None:
+        """Drop all but the latest `keep` invalidation records."""
+        with self._lock:
+            self._compact_invalidations(keep)
+
+    def _compact_invalidations(self, keep: int) -> None:
+        self._conn.execute(
+            "DELETE FROM invalidations WHERE seq <= (SELECT MAX(seq) FROM invalidations) - ?", (keep,)
+        )
+
+
+class TieredStore:
+    """
+    A per-process LRU of decoded entries in front of a SharedStore.
+
+    Reads are served from the LRU when possible. Before each read, writes made
+    by other processes are detected through the shared store's data version
+    and the affected keys are dropped from the LRU.
+    """
+
+    def __init__(self, local: LRUStore, shared: SharedStore):
+        self.local = local
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._data_version = shared.data_version()
+        self._seq = shared.invalidation_seq()
+
+    def _sync(self) -> None:
+        data_version = self.shared.data_version()
+        if data_version == self._data_version:
+            return
+        with self._lock:
+            self._data_version = data_version
+            self._seq, keys = self.shared.invalidations_since(self._seq)
+        if keys is None:
+            self.local.clear()
+            return
+        for key in keys:
+            self.local.delete(key)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        self._sync()
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        self.shared.set(key, entry)
+        self.local.set(key, entry)
+
+    def delete(self, key: str) -> None:
+        self.shared.delete(key)
+        self.local.delete(key)
+
+    def content_hash(self, key: str) -> Optional[str]:
+        self._sync()
+        body_hash = self.local.content_hash(key)
+        return body_hash if body_hash is not None else self.shared.content_hash(key)
+
+    def touch(
+        self, key: str, stored_at: float, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> bool:
+        self.local.touch(key, stored_at, etag, last_modified)
+        return self.shared.touch(key, stored_at, etag, last_modified)
+
+    def keys(self) -> Iterator[str]:
+        return self.shared.keys()
+
+
+class ResponseCache:
+    """A TTL cache of query results keyed by `request_key`."""
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        store=None,
+        stale_while_revalidate: float = 0,
+        max_tracked_keys: int = 10000,
+    ):
+        """
+        Args:
+            ttl: Seconds an entry is served without revalidation (default: 300)
+            store: Backing store: MemoryStore (default), LRUStore, SharedStore
+                or TieredStore
+            stale_while_revalidate: Seconds past the TTL during which an expired
+                entry is still served while it is refreshed in the background
+                (default: 0, always revalidate before returning)
+            max_tracked_keys: Number of keys whose accesses are counted before
+                all counts are decayed (default: 10000)
+        """
+        self.ttl = ttl
+        self.store = store if store is not None else MemoryStore()
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_tracked_keys = max_tracked_keys
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+        self._refresh_done = threading.Condition(self._lock)
+        self._access_counts: Counter = Counter()
+        self._requests: Dict[str, Tuple[str, Optional[Dict[str, Any]]]] = {}
+
+    def on_change(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        """
+        Register a callback run with (key, data) whenever an entry's content changes.
+
+        Use this for downstream processing (re-modelling, re-indexing) so that
+        it is skipped when a refresh returns an identical payload.
+        """
+        self._listeners.append(listener)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Get an entry, fresh or not."""
+        return self.store.get(key)
+
+    def is_fresh(self, entry: CacheEntry, now: Optional[float] = None) -> bool:
+        """Check whether an entry is younger than the TTL."""
+        return (now if now is not None else time.time()) - entry.stored_at < self.ttl
+
+    def is_servable_stale(self, entry: CacheEntry, now: Optional[float] = None) -> bool:
+        """Check whether an expired entry may still be served while it is refreshed."""
+        age = (now if now is not None else time.time()) - entry.stored_at
+        return age < self.ttl + self.stale_while_revalidate
+
+    def begin_refresh(self, key: str) -> bool:
+        """
+        Claim the refresh of an entry so that only one refresh per key runs.
+
+        Returns:
+            True if the caller should refresh the entry, False if a refresh is already running
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: str) -> None:
+        """Release a refresh claimed with `begin_refresh`."""
+        with self._lock:
+            self._refreshing.discard(key)
+            self._refresh_done.notify_all()
+
+    def wait_refresh(self, key: str, timeout: Optional[float] = None) -> None:
+        """Block until no refresh of `key` claimed with `begin_refresh` is running."""
+        with self._refresh_done:
+            self._refresh_done.wait_for(lambda: key not in self._refreshing, timeout)
+
+    def record_access(self, key: str, query: str, variables: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Count an access to a key and remember the request that produces it.
+
+        Once more than `max_tracked_keys` keys are counted, all counts are
+        decayed, which drops keys that were accessed only once.
+        """
+        with self._lock:
+            self._access_counts[key] += 1
+            self._requests[key] = (query, variables)
+            if len(self._access_counts) > self.max_tracked_keys:
+                self._decay()
+
+    def _decay(self) -> None:
+        """Halve all access counts and forget keys that drop to zero. Requires `_lock`."""
+        self._access_counts = Counter(
+            {key: count // 2 for key, count in self._access_counts.items() if count > 1}
+        )
+        for key in list(self._requests):
+            if key not in self._access_counts and key not in self._refreshing:
+                del self._requests[key]
+
+    def hottest(self, n: int) -> List[Tuple[str, str, Optional[Dict[str, Any]]]]:
+        """
+        Get the `n` most accessed keys and halve all access counts.
+
+        Halving on every call makes the ranking favour recent traffic.
+
+        Returns:
+            List of (key, query, variables) tuples, hottest first
+        """
+        with self._lock:
+            hot = [(key, *self._requests[key]) for key, _ in self._access_counts.most_common(n)]
+            self._decay()
+        return hot
+
+    def put(
+        self,
+        key: str,
+        data: Dict[str, Any],
+        body_hash: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> bool:
+        """
+        Store a result and notify listeners if its content changed.
+
+        Returns:
+            True if the content differs from the previously cached entry
+        """
+        changed = self.store.content_hash(key) != body_hash
+        self.store.set(key, CacheEntry(data, body_hash, time.time(), etag, last_modified))
+        if changed:
+            for listener in self._listeners:
+                listener(key, data)
+        return changed
+
+    def touch(self, key: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
+        """
+        Mark an entry as revalidated without replacing its data.
+
+        Only the timestamp and validators are updated in the store, so the
+        data is neither decoded nor rewritten.
+
+        Returns:
+            True if the key was cached
+        """
+        return self.store.touch(key, time.time(), etag, last_modified)
+
+    def invalidate(self, key: str) -> None:
+        """Remove an entry."""
+        self.store.delete(key)
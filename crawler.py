@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Anilist API Parallel Crawler
+
+Runs one GraphQL query over many variable sets (ID ranges or page ranges)
+across a process pool. All workers draw from a single token bucket held in
+shared memory, so the pool as a whole stays within the Anilist rate limit.
+
+When the daemon is running (see daemon.py), workers send their queries
+through it in the bulk lane instead, so the crawl shares the daemon's rate
+limit with interactive lookups and backs off while they spike. The shared
+token bucket (and `--rate`) is then unused, and results bypass the daemon's
+cache.
+"""
+
+import json
+import os
+import time
+import argparse
+import multiprocessing
+from contextlib import nullcontext
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from anilist_client import AnilistClient
+from cache import request_key
+from daemon import find_daemon, get_client
+from rate_limit import TokenBucket, DEFAULT_RATE, DEFAULT_CAPACITY
+from scheduler import BULK
+
+
+# Per-process client, created once by the pool initializer.
+_worker_client: Optional[AnilistClient] = None
+
+
+def id_units(
+    start: int, stop: int, key: str = "id", variables: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Build one variable set per ID in the inclusive range [start, stop]."""
+    return [dict(variables or {}, **{key: media_id}) for media_id in range(start, stop + 1)]
+
+
+def page_units(
+    first: int, last: int, variables: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Build one variable set per page in the inclusive range [first, last]."""
+    return [dict(variables or {}, page=page) for page in range(first, last + 1)]
+
+
+def is_final_error(error: Exception) -> bool:
+    """
+    Check whether a failed request would fail the same way if it were retried.
+
+    4xx statuses other than 429 (e.g. 404 for an ID that does not exist) are
+    final; rate limiting, 5xx statuses and network errors are not.
+    """
+    status_code = getattr(error, "status_code", None)
+    return status_code is not None and 400 <= status_code < 500 and status_code != 429
+
+
+def _init_worker(rate_limiter: TokenBucket) -> None:
+    global _worker_client
+    _worker_client = get_client(priority=BULK, cache=False, rate_limiter=rate_limiter)
+
+
+def _run_batch(task: Tuple[str, List[Tuple[int, Dict[str, Any]]]]) -> Dict[str, Any]:
+    query, units = task
+    started = time.monotonic()
+    results = []
+    for index, variables in units:
+        try:
+            results.append((index, _worker_client.run_query(query, variables), None, False))
+        except Exception as e:
+            results.append((index, None, str(e), is_final_error(e)))
+    return {"pid": os.getpid(), "elapsed": time.monotonic() - started, "results": results}
+
+
+class Crawler:
+    """Shards query units across a process pool with a shared rate limit."""
+
+    def __init__(
+        self,
+        query: str,
+        units: List[Dict[str, Any]],
+        processes: int = 4,
+        batch_size: int = 10,
+        rate: float = DEFAULT_RATE,
+        capacity: float = DEFAULT_CAPACITY,
+        checkpoint: Optional[str] = None,
+    ):
+        """
+        Args:
+            query: The GraphQL query string
+            units: One variables object per request
+            processes: Number of worker processes (default: 4)
+            batch_size: Units per task; results come back one batch per task (default: 10)
+            rate: Requests per second shared by all workers
+            capacity: Burst size of the shared token bucket
+            checkpoint: Optional NDJSON file recording completed units for resuming
+        """
+        self.query = query
+        self.units = units
+        # Units are checkpointed by request key, so a checkpoint stays valid
+        # when the crawl is resumed with a different or overlapping range.
+        self.keys = [request_key(query, unit) for unit in units]
+        self.processes = processes
+        self.batch_size = batch_size
+        self.rate_limiter = TokenBucket(rate, capacity, shared=True)
+        self.checkpoint = checkpoint
+        self.worker_stats: Dict[int, Dict[str, float]] = {}
+        self.done = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> set:
+        """
+        Read the keys of completed units and compact the checkpoint log.
+
+        The log holds one JSON-encoded key per line and is only ever appended
+        to while crawling, so it is rewritten here without duplicates.
+        """
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return set()
+        done = set()
+        lines = 0
+        with open(self.checkpoint, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                lines += 1
+                try:
+                    key = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash.
+                if isinstance(key, str):
+                    done.add(key)
+        if lines != len(done):
+            tmp_path = f"{self.checkpoint}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(key) + "\n" for key in done)
+            os.replace(tmp_path, self.checkpoint)
+        return done
+
+    def remaining(self) -> int:
+        """Number of units not recorded as done."""
+        return sum(key not in self.done for key in self.keys)
+
+    def _tasks(self) -> Iterator[Tuple[str, List[Tuple[int, Dict[str, Any]]]]]:
+        pending = [(i, unit) for i, unit in enumerate(self.units) if self.keys[i] not in self.done]
+        for start in range(0, len(pending), self.batch_size):
+            yield self.query, pending[start:start + self.batch_size]
+
+    def run(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Run the crawl, skipping units recorded as done in the checkpoint.
+
+        Units that fail are reported with an `error`. They are retried on the
+        next run unless the failure is final (see `is_final_error`), such as
+        a 404 for an ID that does not exist.
+
+        Yields:
+            Batches of {"variables", "result", "error"} records in completion order
+        """
+        checkpoint_log = open(self.checkpoint, 'a', encoding='utf-8') if self.checkpoint else nullcontext()
+        with checkpoint_log, multiprocessing.Pool(
+            self.processes, initializer=_init_worker, initargs=(self.rate_limiter,)
+        ) as pool:
+            for batch in pool.imap_unordered(_run_batch, self._tasks()):
+                stats = self.worker_stats.setdefault(batch["pid"], {"requests": 0, "errors": 0, "seconds": 0.0})
+                stats["requests"] += len(batch["results"])
+                stats["seconds"] += batch["elapsed"]
+
+                records = []
+                completed = []
+                for index, result, error, final in batch["results"]:
+                    if error is not None:
+                        stats["errors"] += 1
+                    if error is None or final:
+                        completed.append(self.keys[index])
+                    records.append({"variables": self.units[index], "result": result, "error": error})
+                yield records
+
+                # Completed keys are appended, so each batch writes only its own units.
+                self.done.update(completed)
+                if self.checkpoint and completed:
+                    checkpoint_log.writelines(json.dumps(key) + "\n" for key in completed)
+                    checkpoint_log.flush()
+
+    def throughput(self) -> Dict[int, float]:
+        """Requests per second of each worker process, keyed by PID."""
+        return {
+            pid: stats["requests"] / stats["seconds"] if stats["seconds"] else 0.0
+            for pid, stats in self.worker_stats.items()
+        }
+
+
+def parse_range(value):
+    """Parse an inclusive `START-END` range."""
+    start, _, end = value.partition('-')
+    return int(start), int(end or start)
+
+
+def main():
+    """Main function to run a parallel crawl."""
+    parser = argparse.ArgumentParser(description='Crawl the Anilist API in parallel')
+
+    query_source = parser.add_mutually_exclusive_group(required=True)
+    query_source.add_argument('-q', '--query', help='GraphQL query string')
+    query_source.add_argument('-f', '--file', help='File containing GraphQL query')
+
+    units = parser.add_mutually_exclusive_group(required=True)
+    units.add_argument('--ids', type=parse_range, help='Inclusive ID range, e.g. 1-5000 (sets $id)')
+    units.add_argument('--pages', type=parse_range, help='Inclusive page range, e.g. 1-50 (sets $page)')
+
+    parser.add_argument('-v', '--variables', help='JSON string of variables shared by every unit')
+    parser.add_argument('-p', '--processes', type=int, default=4, help='Number of worker processes')
+    parser.add_argument('-b', '--batch-size', type=int, default=10, help='Requests per worker task')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second for the whole pool')
+    parser.add_argument('-c', '--checkpoint', help='Checkpoint file for resuming the crawl')
+    parser.add_argument('-o', '--output', required=True, help='NDJSON file results are appended to')
+
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            query = f.read()
+    else:
+        query = args.query
+
+    variables = json.loads(args.variables) if args.variables else None
+    if args.ids:
+        crawl_units = id_units(*args.ids, variables=variables)
+    else:
+        crawl_units = page_units(*args.pages, variables)
+
+    crawler = Crawler(
+        query,
+        crawl_units,
+        processes=args.processes,
+        batch_size=args.batch_size,
+        rate=args.rate,
+        checkpoint=args.checkpoint,
+    )
+    if find_daemon() is not None:
+        print("Sending requests through the daemon; its rate limit applies and --rate is ignored")
+    print(f"Crawling {crawler.remaining()} of {len(crawl_units)} units")
+
+    with open(args.output, 'a', encoding='utf-8') as f:
+        for records in crawler.run():
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+
+    for pid, rate in crawler.throughput().items():
+        stats = crawler.worker_stats[pid]
+        print(f"Worker {pid}: {stats['requests']} requests, {stats['errors']} errors, {rate:.2f} req/s")
+
+
+if __name__ == "__main__":
+    main()
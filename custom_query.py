@@ -7,9 +7,13 @@ Anilist API Custom Query Runner
 This script allows you to run custom GraphQL queries against the Anilist API.
 """
 
+import os
+import sys
 import json
 import argparse
-from anilist_client import AnilistClient
+from contextlib import nullcontext
+from daemon import get_client
+from rate_limit import TokenBucket, DEFAULT_RATE
 
 
 def format_json(data):
@@ -17,19 +21,282 @@ def format_json(data):
     return json.dumps(data, indent=2, ensure_ascii=False)
 
 
-def run_query_from_string(query_string, variables=None):
+def run_query_from_string(query_string, variables=None, client=None):
     """Run a GraphQL query from a string."""
-    client = AnilistClient()
+    client = client or get_client()
     result = client.run_query(query_string, variables)
     return result
 
 
-def run_query_from_file(query_file, variables=None):
+def run_query_from_file(query_file, variables=None, client=None):
     """Run a GraphQL query from a file."""
     with open(query_file, 'r', encoding='utf-8') as f:
         query_string = f.read()
     
-    return run_query_from_string(query_string, variables)
+    return run_query_from_string(query_string, variables, client)
+
+
+def output_compression(path=None, compress=None):
+    """Get the compression of an output file: `compress`, or inferred from a .gz / .zst suffix."""
+    if compress is None and path is not None:
+        if path.endswith('.gz'):
+            return 'gzip'
+        if path.endswith('.zst'):
+            return 'zstd'
+    return compress
+
+
+def open_output(path=None, compress=None):
+    """
+    Open a text stream for results.
+
+    Args:
+        path: Output file (default: stdout)
+        compress: "gzip" or "zstd"; inferred from a .gz / .zst suffix when omitted
+
+    Returns:
+        A context manager yielding a writable text stream
+    """
+    if path is None:
+        if compress:
+            raise ValueError("Compressed output requires --output")
+        return nullcontext(sys.stdout)
+    
+    compress = output_compression(path, compress)
+    if compress == 'gzip':
+        import gzip
+        return gzip.open(path, 'wt', encoding='utf-8')
+    if compress == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd output requires the 'zstandard' package (pip install zstandard)")
+        return zstandard.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def iter_pages(client, query_string, variables=None, max_pages=None):
+    """
+    Run a paginated query page by page until `pageInfo.hasNextPage` is false.
+
+    The query must take a `$page` variable and select `Page { pageInfo { hasNextPage } }`.
+
+    Yields:
+        The response of each page as it arrives
+    """
+    variables = dict(variables or {})
+    page = variables.get('page') or 1
+    fetched = 0
+    while True:
+        variables['page'] = page
+        result = client.run_query(query_string, variables)
+        yield result
+        fetched += 1
+        
+        page_data = (result.get('data') or {}).get('Page') or {}
+        has_next = (page_data.get('pageInfo') or {}).get('hasNextPage')
+        if not has_next or (max_pages is not None and fetched >= max_pages):
+            return
+        page += 1
+
+
+def iter_records(result):
+    """
+    Yield the records of a response: the items of every list under a `Page`,
+    or the object itself for single-object root fields such as `Media`.
+    """
+    if result.get('errors'):
+        yield {'errors': result['errors']}
+    for root in (result.get('data') or {}).values():
+        if not isinstance(root, dict):
+            continue
+        lists = [value for key, value in root.items() if key != 'pageInfo' and isinstance(value, list)]
+        if lists:
+            for items in lists:
+                yield from items
+        else:
+            yield root
+
+
+def write_results(results, out, output_format='pretty', paginated=False, flush=True):
+    """
+    Write responses to `out` incrementally.
+
+    "ndjson" writes one compact line per record. "pretty" and "compact" write a
+    single response as one JSON document, or the records of paginated
+    responses as one JSON array that grows as pages arrive.
+
+    With `flush`, `out` is flushed after every page so records show up as
+    they arrive. Pass False for compressed streams, where every flush ends a
+    compression block and makes the output larger.
+
+    Returns:
+        Number of records written
+    """
+    indent = 2 if output_format == 'pretty' else None
+    separators = None if indent else (',', ':')
+    
+    if output_format != 'ndjson' and not paginated:
+        for result in results:
+            if indent:
+                # Stream the indented document instead of building one big string.
+                json.dump(result, out, ensure_ascii=False, indent=indent)
+            else:
+                out.write(json.dumps(result, ensure_ascii=False, separators=separators))
+            out.write("\n")
+            return 1
+        return 0
+    
+    count = 0
+    if output_format != 'ndjson':
+        out.write("[")
+    for result in results:
+        for record in iter_records(result):
+            if output_format == 'ndjson':
+                out.write(json.dumps(record, ensure_ascii=False, separators=separators) + "\n")
+            else:
+                encoded = json.dumps(record, ensure_ascii=False, indent=indent, separators=separators)
+                if indent:
+                    encoded = "\n  " + encoded.replace("\n", "\n  ")
+                out.write(("," if count else "") + encoded)
+            count += 1
+        if flush:
+            out.flush()
+    if output_format != 'ndjson':
+        out.write("\n]\n" if indent and count else "]\n")
+    return count
+
+
+def load_batch(batch_file):
+    """
+    Load batch items from a JSONL file or a multi-key variables file.
+
+    JSONL files hold one `{"query": ..., "variables": ...}` or
+    `{"file": ..., "variables": ...}` record per line, with an optional `id`.
+    Any other file is read as a JSON object like query_examples/variables.json,
+    where each key names a `<key>.graphql` file in the same directory.
+
+    Lines are not parsed and query files are not read here, so that a bad
+    record only fails its own item; see `run_item`.
+
+    Returns:
+        List of {"id", "record", "base_dir"} items, where `record` is a raw
+        JSONL line or an already decoded record
+    """
+    base_dir = os.path.dirname(os.path.abspath(batch_file))
+    with open(batch_file, 'r', encoding='utf-8') as f:
+        if batch_file.endswith(('.jsonl', '.ndjson')):
+            return [
+                {"id": index, "record": line, "base_dir": base_dir}
+                for index, line in enumerate(line for line in f if line.strip())
+            ]
+        return [
+            {
+                "id": name,
+                "record": {"id": name, "file": f"{name}.graphql", "variables": variables},
+                "base_dir": base_dir,
+            }
+            for name, variables in json.load(f).items()
+        ]
+
+
+def decode_record(item):
+    """Decode a batch item's record, parsing it first if it is a raw JSONL line."""
+    record = item["record"]
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("Batch record must be a JSON object")
+    return record
+
+
+def load_query(record, base_dir, query_files=None):
+    """
+    Get a batch record's query, reading its `file` if it has no inline `query`.
+
+    Args:
+        record: A decoded batch record
+        base_dir: Directory relative `file` paths are resolved against
+        query_files: Optional dict caching query file contents by path
+
+    Returns:
+        The GraphQL query string
+    """
+    if record.get("query") is not None:
+        return record["query"]
+    if "file" not in record:
+        raise ValueError("Batch record needs a query or a file")
+    query_file = os.path.join(base_dir, record["file"])
+    if query_files is not None and query_file in query_files:
+        return query_files[query_file]
+    with open(query_file, 'r', encoding='utf-8') as f:
+        query = f.read()
+    if query_files is not None:
+        query_files[query_file] = query
+    return query
+
+
+def run_item(client, item, query_files=None):
+    """
+    Decode and run one batch item.
+
+    Returns:
+        A {"id", "variables", "result"} record, or an {"id", "error"} record
+        (with `variables` once they are known) if the item failed
+    """
+    record = {"id": item["id"]}
+    try:
+        batch_record = decode_record(item)
+        record["id"] = batch_record.get("id", item["id"])
+        query = load_query(batch_record, item["base_dir"], query_files)
+        record["variables"] = batch_record.get("variables")
+        record["result"] = client.run_query(query, record["variables"])
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def run_batch(items, out, concurrency=4, rate=DEFAULT_RATE, flush=True):
+    """
+    Run batch items concurrently over one pooled client.
+
+    Each result is written to `out` as one JSON line as soon as it completes.
+    Failures, including unreadable records and query files, are captured in
+    the item's `error` field instead of stopping the batch. At most
+    `concurrency * 2` items are in flight, and each result is dropped once it
+    is written, so memory does not grow with the size of the batch.
+
+    Args:
+        flush: Flush `out` after every line; pass False for compressed streams
+
+    Returns:
+        Number of failed items
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    
+    client = get_client(rate_limiter=TokenBucket(rate), pool_size=concurrency)
+    query_files = {}
+    failures = 0
+    window = concurrency * 2
+    pending = set()
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            for item in items:
+                pending.add(executor.submit(run_item, client, item, query_files))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                if "error" in record:
+                    failures += 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if flush:
+                out.flush()
+    return failures
 
 
 def main():
@@ -40,6 +307,7 @@ def main():
     query_source = parser.add_mutually_exclusive_group(required=True)
     query_source.add_argument('-q', '--query', help='GraphQL query string')
     query_source.add_argument('-f', '--file', help='File containing GraphQL query')
+    query_source.add_argument('-b', '--batch', help='JSONL file of queries, or a multi-key variables file')
     
     # Variables
     parser.add_argument('-v', '--variables', help='JSON string of variables')
@@ -47,9 +315,31 @@ def main():
     
     # Output options
     parser.add_argument('-o', '--output', help='Output file for results')
+    parser.add_argument('--format', choices=['pretty', 'compact', 'ndjson'], default='pretty',
+                        help='Output format (default: pretty)')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'],
+                        help='Compress the output file (default: inferred from a .gz / .zst suffix)')
+    parser.add_argument('-p', '--paginate', action='store_true',
+                        help='Follow Page.pageInfo.hasNextPage and write records as pages arrive')
+    parser.add_argument('--max-pages', type=int, help='Maximum number of pages to fetch with --paginate')
+    
+    # Batch options
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Concurrent requests in batch mode')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second in batch mode')
     
     args = parser.parse_args()
     
+    if args.batch:
+        items = load_batch(args.batch)
+        with open_output(args.output, args.compress) as out:
+            failures = run_batch(items, out, args.concurrency, args.rate,
+                                 flush=output_compression(args.output, args.compress) is None)
+        if args.output:
+            print(f"Results saved to {args.output}")
+        if failures:
+            print(f"{failures} of {len(items)} queries failed", file=sys.stderr)
+        return
+    
     # Parse variables
     variables = None
     if args.variables:
@@ -60,24 +350,28 @@ def main():
     
     # Run query
     if args.query:
-        result = run_query_from_string(args.query, variables)
+        query_string = args.query
     else:  # args.file
-        result = run_query_from_file(args.file, variables)
+        with open(args.file, 'r', encoding='utf-8') as f:
+            query_string = f.read()
     
-    # Output results
-    formatted_result = format_json(result)
+    client = get_client()
+    if args.paginate:
+        results = iter_pages(client, query_string, variables, args.max_pages)
+    else:
+        results = [run_query_from_string(query_string, variables, client)]
+    
+    # Output results as they arrive
+    with open_output(args.output, args.compress) as out:
+        write_results(results, out, args.format, args.paginate,
+                      flush=output_compression(args.output, args.compress) is None)
     
     if args.output:
-        with open(args.output, 'w', encoding='utf-8') as f:
-            f.write(formatted_result)
         print(f"Results saved to {args.output}")
-    else:
-        print(formatted_result)
 
 
 if __name__ == "__main__":
     # If no arguments are provided, show example usage
-    import sys
     if len(sys.argv) == 1:
         print("""
 Anilist API Custom Query Runner
@@ -104,6 +398,21 @@ Example Usage:
 
    python custom_query.py --file query.graphql --variables-file vars.json --output results.json
 
+5. Export every page of a paginated query as gzip-compressed NDJSON:
+
+   python custom_query.py --file query_examples/seasonal_anime.graphql --variables-file vars.json --paginate --format ndjson --output media.ndjson.gz
+
+6. Run many queries in one process (results are written as JSON lines):
+
+   python custom_query.py --batch queries.jsonl --concurrency 4 --output results.jsonl
+   python custom_query.py --batch query_examples/variables.json
+
+7. Reuse a warm client (connection pool, cache, rate limit) across runs:
+
+   export ANILIST_DAEMON_SOCKET=/tmp/anilist.sock
+   python daemon.py &
+   python custom_query.py --query '{ Media(id: 1) { id title { romaji } } }'
+
 Example Query File (query.graphql):
 ---------------------------------
 query ($id: Int) {
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Anilist API Client Daemon
+
+Keeps one warm AnilistClient (connection pool, cache and rate-limit state)
+alive behind a Unix socket. The command line scripts talk to it through
+`DaemonClient` when the ANILIST_DAEMON_SOCKET environment variable is set,
+so every invocation shares the same cache and rate limit.
+
+Start the daemon:
+
+    ANILIST_DAEMON_SOCKET=/tmp/anilist.sock python daemon.py
+"""
+
+import os
+import json
+import socket
+import argparse
+from typing import Optional
+
+
+SOCKET_ENV = "ANILIST_DAEMON_SOCKET"
+
+# Client methods that may be called through the daemon.
+DAEMON_METHODS = ("run_query", "refresh", "get_anime_by_id", "search_anime", "get_seasonal_anime", "similar")
+# Methods that take a scheduler lane and a cache switch.
+PRIORITY_METHODS = ("run_query", "refresh")
+
+
+class DaemonError(Exception):
+    """An error raised by the daemon while running a client method."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        # The HTTP status of the API error behind this error, if any.
+        self.status_code = status_code
+
+
+class DaemonClient:
+    """A thin client forwarding AnilistClient method calls to the daemon."""
+
+    def __init__(
+        self,
+        socket_path: str,
+        timeout: float = 60,
+        ping_timeout: float = 0.5,
+        priority: Optional[str] = None,
+        cache: bool = True,
+    ):
+        """
+        Args:
+            socket_path: The daemon's Unix socket
+            timeout: Seconds to wait for a method call (default: 60)
+            ping_timeout: Seconds to wait for a ping, kept short so that a hung
+                daemon does not stall script start-up (default: 0.5)
+            priority: Scheduler lane for `run_query` and `refresh` calls
+                (default: None, the daemon's interactive lane)
+            cache: Whether `run_query` and `refresh` calls use the daemon's
+                cache (default: True)
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.ping_timeout = ping_timeout
+        self.priority = priority
+        self.cache = cache
+
+    def _call(self, method, *args, **kwargs):
+        return self._send({"method": method, "args": args, "kwargs": kwargs}, self.timeout)
+
+    def _send(self, request, timeout):
+        request = json.dumps(request, ensure_ascii=False)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(self.socket_path)
+            conn.sendall(request.encode("utf-8") + b"\n")
+            with conn.makefile("rb") as reply_file:
+                reply = json.loads(reply_file.readline())
+        if "error" in reply:
+            raise DaemonError(reply["error"], reply.get("status_code"))
+        return reply["result"]
+
+    def __getattr__(self, name):
+        if name not in DAEMON_METHODS:
+            raise AttributeError(name)
+        defaults = {}
+        if name in PRIORITY_METHODS:
+            if self.priority is not None:
+                defaults["priority"] = self.priority
+            if not self.cache:
+                defaults["cache"] = False
+        if defaults:
+            return lambda *args, **kwargs: self._call(name, *args, **dict(defaults, **kwargs))
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+    def metrics(self):
+        """Queue-wait metrics per scheduler lane."""
+        return self._call("metrics")
+
+    def ping(self) -> bool:
+        """Check whether the daemon is reachable."""
+        try:
+            return self._send({"method": "ping"}, self.ping_timeout) == "pong"
+        except (OSError, ValueError, DaemonError):
+            return False
+
+
+def find_daemon(priority: Optional[str] = None, cache: bool = True) -> Optional[DaemonClient]:
+    """
+    Get a DaemonClient if ANILIST_DAEMON_SOCKET names a reachable daemon.
+
+    Args:
+        priority: Scheduler lane for the client's `run_query` and `refresh` calls
+        cache: Whether those calls use the daemon's cache
+
+    Returns:
+        The client, or None if no daemon is listening
+    """
+    socket_path = os.environ.get(SOCKET_ENV)
+    if socket_path and os.path.exists(socket_path):
+        client = DaemonClient(socket_path, priority=priority, cache=cache)
+        if client.ping():
+            return client
+    return None
+
+
+def get_client(priority: Optional[str] = None, cache: bool = True, **client_options):
+    """
+    Get a DaemonClient if a daemon is listening, otherwise a new AnilistClient.
+
+    The daemon is used when ANILIST_DAEMON_SOCKET names a reachable socket.
+    `anilist_client` (and with it `requests`) is only imported on the fallback path.
+
+    Args:
+        priority: Scheduler lane the daemon queues this client's queries in.
+            Only the daemon schedules lanes, because it is where interactive
+            and bulk traffic share one rate limit; a fallback client is
+            limited by its own `rate_limiter` alone, and the daemon ignores it.
+        cache: Whether queries go through the daemon's cache. Bulk callers
+            pass False so that one-off results do not evict the entries
+            interactive lookups rely on.
+        client_options: Keyword arguments for AnilistClient when no daemon is used
+    """
+    client = find_daemon(priority, cache)
+    if client is not None:
+        return client
+
+    from anilist_client import AnilistClient
+
+    return AnilistClient(**client_options)
+
+
+def serve(socket_path, cache_ttl=300, cache_entries=10000):
+    """
+    Run the daemon until interrupted.
+
+    Args:
+        socket_path: Unix socket to listen on
+        cache_ttl: Seconds cached results stay fresh (default: 300)
+        cache_entries: Maximum number of cached results; the least recently
+            used are evicted first (default: 10000)
+    """
+    import socketserver
+
+    from anilist_client import AnilistClient
+    from cache import ResponseCache, LRUStore
+    from scheduler import PriorityScheduler
+
+    # Callers pass priority="bulk" and cache=False to run_query for crawl traffic.
+    cache = ResponseCache(ttl=cache_ttl, store=LRUStore(max_entries=cache_entries))
+    client = AnilistClient(scheduler=PriorityScheduler(), cache=cache)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                request = json.loads(self.rfile.readline())
+                method = request.get("method")
+                if method == "ping":
+                    reply = {"result": "pong"}
+                elif method == "metrics":
+                    reply = {"result": client.scheduler.metrics()}
+                elif method in DAEMON_METHODS:
+                    result = getattr(client, method)(*request.get("args", []), **request.get("kwargs", {}))
+                    reply = {"result": result}
+                else:
+                    reply = {"error": f"Unknown method: {method}"}
+            except Exception as e:
+                reply = {"error": f"{type(e).__name__}: {e}", "status_code": getattr(e, "status_code", None)}
+            self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+        server.daemon_threads = True
+        print(f"Anilist daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def main():
+    """Main function to start the daemon."""
+    parser = argparse.ArgumentParser(description='Keep a warm Anilist API client behind a Unix socket')
+    parser.add_argument('-s', '--socket', default=os.environ.get(SOCKET_ENV),
+                        help=f'Socket path (default: ${SOCKET_ENV})')
+    parser.add_argument('--cache-ttl', type=float, default=300, help='Seconds cached results stay fresh')
+    parser.add_argument('--cache-entries', type=int, default=10000,
+                        help='Maximum number of cached results (least recently used are evicted)')
+    args = parser.parse_args()
+
+    if not args.socket:
+        parser.error(f"--socket or {SOCKET_ENV} is required")
+    serve(args.socket, args.cache_ttl, args.cache_entries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Anilist API Job Queue
+
+A durable queue of query units stored in SQLite (WAL mode). Each unit moves
+from pending to in_flight to done, and its result is written in the same
+transaction that marks it done, so a crashed crawl resumes where it stopped
+and never stores a result twice.
+"""
+
+import json
+import queue
+import sqlite3
+import argparse
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from anilist_client import AnilistClient, request_key
+from crawler import id_units, page_units, parse_range, is_final_error
+from daemon import get_client
+from rate_limit import TokenBucket
+from scheduler import BULK
+
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+# Longest time an idle fetch thread sleeps before checking for retries again.
+MAX_RETRY_POLL = 5.0
+
+
+class JobQueue:
+    """A persistent queue of GraphQL query units."""
+
+    def __init__(self, path: str, max_attempts: int = 3, retry_delay: float = 5.0):
+        """
+        Args:
+            path: SQLite database file
+            max_attempts: Attempts before a unit is marked failed (default: 3)
+            retry_delay: Seconds before a failed unit is retried, doubled after
+                every further attempt (default: 5)
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                query TEXT NOT NULL,
+                variables TEXT,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                not_before REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+            CREATE TABLE IF NOT EXISTS results (
+                job_id INTEGER PRIMARY KEY REFERENCES jobs (id),
+                result TEXT NOT NULL
+            );
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "not_before" not in columns:
+            # Queues created before retries were delayed.
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN not_before REAL NOT NULL DEFAULT 0")
+        self.recovered = self.recover()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self, mode: str = "IMMEDIATE"):
+        """Run a block in one transaction, rolling it back if the block raises."""
+        self._conn.execute(f"BEGIN {mode}")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def recover(self) -> int:
+        """
+        Return units left in flight by a previous run to the pending state.
+
+        Returns:
+            Number of recovered units
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?",
+                (PENDING, time.time(), IN_FLIGHT),
+            )
+            return cursor.rowcount
+
+    def enqueue(self, query: str, variables: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Add a query unit unless the same query and variables are already queued.
+
+        Returns:
+            True if the unit was added
+        """
+        return self.enqueue_many(query, [variables]) == 1
+
+    def enqueue_many(self, query: str, variable_sets: Iterable[Optional[Dict[str, Any]]]) -> int:
+        """
+        Add one query unit per variables object, skipping known units.
+
+        Returns:
+            Number of units added
+        """
+        now = time.time()
+        rows = [
+            (request_key(query, variables), query, json.dumps(variables, ensure_ascii=False), PENDING, now)
+            for variables in variable_sets
+        ]
+        with self._lock, self._transaction("DEFERRED"):
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (key, query, variables, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            added = self._conn.total_changes - before
+        return added
+
+    def claim(self, limit: int = 1) -> List[Tuple[int, str, Optional[Dict[str, Any]]]]:
+        """
+        Move up to `limit` pending units whose retry delay has passed to in_flight.
+
+        Returns:
+            List of (job ID, query, variables) tuples
+        """
+        with self._lock, self._transaction():
+            rows = self._conn.execute(
+                "SELECT id, query, variables FROM jobs WHERE state = ? AND not_before <= ? ORDER BY id LIMIT ?",
+                (PENDING, time.time(), limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(IN_FLIGHT, time.time(), job_id) for job_id, _, _ in rows],
+            )
+        return [(job_id, query, json.loads(variables)) for job_id, query, variables in rows]
+
+    def complete(self, results: Iterable[Tuple[int, Dict[str, Any]]]) -> int:
+        """
+        Store results and mark their units done in one transaction.
+
+        Results for units that are already done are ignored.
+
+        Args:
+            results: (job ID, result) pairs
+
+        Returns:
+            Number of results stored
+        """
+        now = time.time()
+        stored = 0
+        with self._lock, self._transaction():
+            for job_id, result in results:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET state = ?, error = NULL, updated_at = ? WHERE id = ? AND state != ?",
+                    (DONE, now, job_id, DONE),
+                )
+                if cursor.rowcount:
+                    self._conn.execute(
+                        "INSERT INTO results (job_id, result) VALUES (?, ?)",
+                        (job_id, json.dumps(result, ensure_ascii=False)),
+                    )
+                    stored += 1
+        return stored
+
+    def fail(self, job_id: int, error: str, retry: bool = True) -> None:
+        """
+        Record a failed attempt.
+
+        The unit is retried after an exponentially growing delay until
+        `max_attempts`, or marked failed right away if `retry` is False.
+        """
+        now = time.time()
+        max_attempts = self.max_attempts if retry else 0
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, updated_at = ?, "
+                "not_before = ? * (1 << (attempts - 1)) + ? WHERE id = ? AND state = ?",
+                (max_attempts, FAILED, PENDING, error, now, self.retry_delay, now, job_id, IN_FLIGHT),
+            )
+
+    def next_retry_at(self) -> Optional[float]:
+        """
+        Get the earliest time a pending unit may be claimed.
+
+        Returns:
+            A timestamp, or None if no units are pending
+        """
+        with self._lock:
+            (not_before,) = self._conn.execute(
+                "SELECT MIN(not_before) FROM jobs WHERE state = ?", (PENDING,)
+            ).fetchone()
+        return not_before
+
+    def requeue_failed(self) -> int:
+        """
+        Return failed units to the pending state with their attempts reset.
+
+        Returns:
+            Number of requeued units
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, not_before = 0, updated_at = ? WHERE state = ?",
+                (PENDING, time.time(), FAILED),
+            )
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of units in each state."""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def results(self) -> Iterator[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]:
+        """Iterate over (variables, result) pairs of completed units in job order."""
+        # A separate connection lets callers iterate while workers keep writing.
+        with closing(sqlite3.connect(self.path)) as conn:
+            cursor = conn.execute(
+                "SELECT jobs.variables, results.result FROM results JOIN jobs ON jobs.id = results.job_id "
+                "ORDER BY jobs.id"
+            )
+            for variables, result in cursor:
+                yield json.loads(variables), json.loads(result)
+
+
+def run_jobs(
+    job_queue: JobQueue,
+    client: AnilistClient,
+    workers: int = 4,
+    claim_size: int = 5,
+    max_pending_writes: int = 100,
+    write_batch_size: int = 50,
+) -> Dict[str, int]:
+    """
+    Drain the queue with fetch threads feeding a single writer thread.
+
+    Fetch threads block once `max_pending_writes` results are waiting to be
+    written, so a slow disk throttles fetching instead of growing memory.
+    If the writer fails, the fetch threads stop and its exception is raised;
+    units left in flight are recovered on the next run. Fetch threads wait
+    for units whose retry delay has not passed yet before they exit.
+
+    Args:
+        job_queue: The queue to drain
+        client: Client used by every fetch thread
+        workers: Number of fetch threads (default: 4)
+        claim_size: Units claimed by a fetch thread at a time (default: 5)
+        max_pending_writes: Capacity of the fetch-to-writer buffer (default: 100)
+        write_batch_size: Results committed per transaction (default: 50)
+
+    Returns:
+        Counts of fetched, stored and failed units
+    """
+    pending_writes: "queue.Queue[Optional[Tuple[int, Dict[str, Any]]]]" = queue.Queue(max_pending_writes)
+    totals = {"fetched": 0, "stored": 0, "failed": 0}
+    totals_lock = threading.Lock()
+    writer_errors: List[BaseException] = []
+    writer_failed = threading.Event()
+
+    def put(item) -> bool:
+        # A timed put so that fetch threads notice a dead writer instead of
+        # blocking on a full buffer forever.
+        while not writer_failed.is_set():
+            try:
+                pending_writes.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch():
+        while not writer_failed.is_set():
+            jobs = job_queue.claim(claim_size)
+            if not jobs:
+                retry_at = job_queue.next_retry_at()
+                if retry_at is None:
+                    return
+                writer_failed.wait(max(0.0, min(retry_at - time.time(), MAX_RETRY_POLL)))
+                continue
+            for job_id, query, variables in jobs:
+                try:
+                    result = client.run_query(query, variables)
+                except Exception as e:
+                    job_queue.fail(job_id, str(e), retry=not is_final_error(e))
+                    with totals_lock:
+                        totals["failed"] += 1
+                    continue
+                if not put((job_id, result)):
+                    return
+                with totals_lock:
+                    totals["fetched"] += 1
+
+    def write():
+        batch = []
+        try:
+            while True:
+                item = pending_writes.get()
+                if item is not None:
+                    batch.append(item)
+                if batch and (item is None or len(batch) >= write_batch_size or pending_writes.empty()):
+                    totals["stored"] += job_queue.complete(batch)
+                    batch = []
+                if item is None:
+                    return
+        except BaseException as e:
+            writer_errors.append(e)
+            writer_failed.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    fetchers = [threading.Thread(target=fetch) for _ in range(workers)]
+    for thread in fetchers:
+        thread.start()
+    for thread in fetchers:
+        thread.join()
+    put(None)
+    writer.join()
+    if writer_errors:
+        raise writer_errors[0]
+    return totals
+
+
+def main():
+    """Main function to queue and run a resumable crawl."""
+    parser = argparse.ArgumentParser(description='Run a resumable crawl backed by a SQLite job queue')
+    parser.add_argument('-d', '--db', required=True, help='SQLite job queue file')
+
+    query_source = parser.add_mutually_exclusive_group()
+    query_source.add_argument('-q', '--query', help='GraphQL query string')
+    query_source.add_argument('-f', '--file', help='File containing GraphQL query')
+
+    units = parser.add_mutually_exclusive_group()
+    units.add_argument('--ids', type=parse_range, help='Inclusive ID range to enqueue, e.g. 1-5000 (sets $id)')
+    units.add_argument('--pages', type=parse_range, help='Inclusive page range to enqueue, e.g. 1-50 (sets $page)')
+
+    parser.add_argument('-v', '--variables', help='JSON string of variables shared by every unit')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='Number of fetch threads')
+    parser.add_argument('--requeue-failed', action='store_true',
+                        help='Return units that exhausted their attempts to the queue before running')
+    parser.add_argument('-o', '--output', help='Export stored results to an NDJSON file')
+
+    args = parser.parse_args()
+
+    job_queue = JobQueue(args.db)
+    if job_queue.recovered:
+        print(f"Recovered {job_queue.recovered} in-flight units from the previous run")
+    if args.requeue_failed:
+        print(f"Requeued {job_queue.requeue_failed()} failed units")
+
+    if args.query or args.file:
+        if args.file:
+            with open(args.file, 'r', encoding='utf-8') as f:
+                query = f.read()
+        else:
+            query = args.query
+        variables = json.loads(args.variables) if args.variables else None
+        if args.ids:
+            variable_sets = id_units(*args.ids, variables=variables)
+        elif args.pages:
+            variable_sets = page_units(*args.pages, variables)
+        else:
+            variable_sets = [variables]
+        print(f"Queued {job_queue.enqueue_many(query, variable_sets)} new units")
+
+    # Through the daemon the crawl runs in the bulk lane of its shared scheduler,
+    # bypassing its cache so one-off results do not evict interactive entries.
+    client = get_client(priority=BULK, cache=False, rate_limiter=TokenBucket())
+    totals = run_jobs(job_queue, client, workers=args.workers)
+    print(f"Fetched {totals['fetched']}, stored {totals['stored']}, failed {totals['failed']}")
+    print(f"Queue state: {job_queue.counts()}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for variables, result in job_queue.results():
+                f.write(json.dumps({"variables": variables, "result": result}, ensure_ascii=False) + "\n")
+        print(f"Results saved to {args.output}")
+
+    job_queue.close()
+
+
+if __name__ == "__main__":
+    main()
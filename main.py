@@ -7,18 +7,58 @@ Anilist API Test Script
 This script demonstrates how to use the Anilist API client to fetch anime data.
 """
 
+import re
 import sys
 import json
+import heapq
 import textwrap
-from anilist_client import AnilistClient
+from daemon import get_client
+
+
+# Description tags replaced in a single pass: <br> becomes a space, <i> / </i> are dropped.
+HTML_REPLACEMENTS = {"<br>": " ", "<i>": "", "</i>": ""}
+HTML_PATTERN = re.compile("|".join(re.escape(tag) for tag in HTML_REPLACEMENTS))
+
+DESCRIPTION_LIMIT = 300
+WRAP_WIDTH = 80
 
 
 class AnimeFormatter:
     """Formats anime data for display."""
     
+    @staticmethod
+    def clean_description(description):
+        """Replace the HTML tags used in Anilist descriptions."""
+        return HTML_PATTERN.sub(lambda match: HTML_REPLACEMENTS[match.group()], description)
+    
+    @staticmethod
+    def wrap_description(description, limit=DESCRIPTION_LIMIT, width=WRAP_WIDTH):
+        """
+        Wrap a description and cut it to `limit` characters.
+        
+        Only a prefix of the description is wrapped. The prefix ends on
+        whitespace so that every line before its last one is laid out exactly
+        as in the fully wrapped text; the full text is wrapped only when that
+        last line would reach into the first `limit` characters.
+        """
+        if len(description) > limit + 2 * width:
+            prefix = description[:limit + 2 * width]
+            cut = max(prefix.rfind(" "), prefix.rfind("\n"), prefix.rfind("\t"))
+            if cut > 0:
+                wrapped = textwrap.fill(prefix[:cut], width=width)
+                if wrapped.rfind("\n") >= limit:
+                    return wrapped[:limit]
+        return textwrap.fill(description, width=width)[:limit]
+    
+    @staticmethod
+    def top_tags(tags, k=3):
+        """Get the `k` highest ranked tags without sorting the whole list."""
+        return heapq.nlargest(k, tags, key=lambda tag: tag["rank"])
+    
     @staticmethod
     def format_anime_details(anime):
         """Format detailed anime information into a readable string."""
+        get = anime.get
         title = anime["title"]
         
         # Format basic info
@@ -27,80 +67,88 @@ class AnimeFormatter:
             f"   {title.get('native', '')}"
         ]
         
-        if title.get("english"):
-            info.append(f"   English: {title['english']}")
+        english = title.get("english")
+        if english:
+            info.append(f"   English: {english}")
         
         # Format description
-        if anime.get("description"):
-            description = anime["description"].replace("<br>", " ").replace("<i>", "").replace("</i>", "")
-            wrapped_desc = textwrap.fill(description, width=80)[:300]
-            if len(description) > 300:
+        description = get("description")
+        if description:
+            description = AnimeFormatter.clean_description(description)
+            wrapped_desc = AnimeFormatter.wrap_description(description)
+            if len(description) > DESCRIPTION_LIMIT:
                 wrapped_desc += "..."
             info.append(f"\n📝 {wrapped_desc}")
         
         # Format key details
         details = []
-        if anime.get("episodes"):
-            details.append(f"Episodes: {anime['episodes']}")
-        if anime.get("duration"):
-            details.append(f"Duration: {anime['duration']}min")
-        if anime.get("status"):
-            details.append(f"Status: {anime['status']}")
+        episodes, duration, status = get("episodes"), get("duration"), get("status")
+        if episodes:
+            details.append(f"Episodes: {episodes}")
+        if duration:
+            details.append(f"Duration: {duration}min")
+        if status:
+            details.append(f"Status: {status}")
         
         if details:
             info.append("\n🔍 " + " | ".join(details))
         
         # Format dates
         dates = []
-        if anime.get("startDate") and anime["startDate"].get("year"):
-            start = anime["startDate"]
+        start = get("startDate")
+        if start and start.get("year"):
             dates.append(f"Start: {start.get('year')}-{start.get('month', '??')}-{start.get('day', '??')}")
         
-        if anime.get("endDate") and anime["endDate"].get("year"):
-            end = anime["endDate"]
+        end = get("endDate")
+        if end and end.get("year"):
             dates.append(f"End: {end.get('year')}-{end.get('month', '??')}-{end.get('day', '??')}")
         
         if dates:
             info.append("📅 " + " | ".join(dates))
         
         # Format season and format
-        if anime.get("season") or anime.get("format"):
+        season, media_format = get("season"), get("format")
+        if season or media_format:
             season_format = []
-            if anime.get("season") and anime.get("seasonYear"):
-                season_format.append(f"{anime['season']} {anime['seasonYear']}")
-            if anime.get("format"):
-                season_format.append(anime["format"])
+            season_year = get("seasonYear")
+            if season and season_year:
+                season_format.append(f"{season} {season_year}")
+            if media_format:
+                season_format.append(media_format)
             
             info.append("🗓️ " + " | ".join(season_format))
         
         # Format genres and tags
-        if anime.get("genres"):
-            info.append(f"🏷️ {', '.join(anime['genres'][:5])}")
+        genres = get("genres")
+        if genres:
+            info.append(f"🏷️ {', '.join(genres[:5])}")
         
-        if anime.get("tags"):
-            top_tags = sorted(anime["tags"], key=lambda x: x["rank"], reverse=True)[:3]
-            info.append(f"🔖 {', '.join(tag['name'] for tag in top_tags)}")
+        tags = get("tags")
+        if tags:
+            info.append(f"🔖 {', '.join(tag['name'] for tag in AnimeFormatter.top_tags(tags))}")
         
         # Format ratings
         ratings = []
-        if anime.get("averageScore"):
-            ratings.append(f"Score: {anime['averageScore']}/100")
-        if anime.get("popularity"):
-            ratings.append(f"Popularity: {anime['popularity']}")
+        average_score, popularity = get("averageScore"), get("popularity")
+        if average_score:
+            ratings.append(f"Score: {average_score}/100")
+        if popularity:
+            ratings.append(f"Popularity: {popularity}")
         
         if ratings:
             info.append("⭐ " + " | ".join(ratings))
         
         # Format studios
-        if anime.get("studios") and anime["studios"].get("nodes"):
-            studios = [studio["name"] for studio in anime["studios"]["nodes"]]
-            info.append(f"🏢 {', '.join(studios)}")
+        studios = get("studios")
+        if studios and studios.get("nodes"):
+            info.append(f"🏢 {', '.join(studio['name'] for studio in studios['nodes'])}")
         
         return "\n".join(info)
     
     @staticmethod
     def format_anime_card(anime):
         """Format basic anime information into a card-like string."""
+        get = anime.get
         title = anime["title"]
         
         info = [
@@ -109,22 +157,54 @@ class AnimeFormatter:
         ]
         
         details = []
-        if anime.get("episodes"):
-            details.append(f"Ep: {anime['episodes']}")
-        if anime.get("format"):
-            details.append(anime["format"])
-        if anime.get("seasonYear"):
-            details.append(str(anime["seasonYear"]))
-        if anime.get("averageScore"):
-            details.append(f"⭐ {anime['averageScore']}/100")
+        episodes, media_format = get("episodes"), get("format")
+        season_year, average_score = get("seasonYear"), get("averageScore")
+        if episodes:
+            details.append(f"Ep: {episodes}")
+        if media_format:
+            details.append(media_format)
+        if season_year:
+            details.append(str(season_year))
+        if average_score:
+            details.append(f"⭐ {average_score}/100")
         
         if details:
             info.append("🔍 " + " | ".join(details))
         
-        if anime.get("genres"):
-            info.append(f"🏷️ {', '.join(anime['genres'][:3])}")
+        genres = get("genres")
+        if genres:
+            info.append(f"🏷️ {', '.join(genres[:3])}")
         
         return "\n".join(info)
+    
+    @staticmethod
+    def render_bulk(media_list, out, detailed=False, separator="\n\n", flush_every=256):
+        """
+        Format many anime and write them to a stream as they are formatted.
+        
+        Args:
+            media_list: Iterable of Media objects
+            out: Writable text stream
+            detailed: Use `format_anime_details` instead of `format_anime_card`
+            separator: Text written after each anime
+            flush_every: Number of anime buffered per write
+        
+        Returns:
+            Number of anime written
+        """
+        format_anime = AnimeFormatter.format_anime_details if detailed else AnimeFormatter.format_anime_card
+        buffer = []
+        count = 0
+        for anime in media_list:
+            buffer.append(format_anime(anime))
+            buffer.append(separator)
+            count += 1
+            if len(buffer) >= 2 * flush_every:
+                out.write("".join(buffer))
+                buffer.clear()
+        if buffer:
+            out.write("".join(buffer))
+        return count
 
 
 def display_anime_details(client, anime_id):
@@ -212,7 +292,7 @@ def get_seasonal_anime(client, year, season, page=1, per_page=5):
 
 def main():
     """Main function to demonstrate the Anilist API client."""
-    client = AnilistClient()
+    client = get_client()
     
     # Example 1: Get anime by ID (Demon Slayer: Kimetsu no Yaiba)
     display_anime_details(client, 101922)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Anilist API Rate Limiting
+
+A token bucket that can be shared by threads or, through shared memory, by
+every process of a multiprocessing pool.
+"""
+
+import threading
+import time
+
+
+# Anilist allows 90 requests per minute per client.
+DEFAULT_RATE = 90 / 60
+DEFAULT_CAPACITY = 90
+
+
+class TokenBucket:
+    """A token bucket rate limiter."""
+
+    def __init__(
+        self, rate: float = DEFAULT_RATE, capacity: float = DEFAULT_CAPACITY, shared: bool = False
+    ):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens (burst size)
+            shared: Keep the bucket state in shared memory so that it can be
+                handed to child processes (e.g. through a Pool initializer)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        if shared:
+            import multiprocessing
+
+            self._lock = multiprocessing.Lock()
+            self._state = multiprocessing.Array("d", [capacity, time.monotonic()], lock=False)
+        else:
+            self._lock = threading.Lock()
+            self._state = [capacity, time.monotonic()]
+
+    def _refill(self, now: float) -> None:
+        tokens, updated_at = self._state[0], self._state[1]
+        self._state[0] = min(self.capacity, tokens + (now - updated_at) * self.rate)
+        self._state[1] = now
+
+    def try_acquire(self, tokens: float = 1, reserve: float = 0) -> float:
+        """
+        Take `tokens` from the bucket if they are available.
+
+        Args:
+            tokens: Number of tokens to take
+            reserve: Number of tokens that must remain in the bucket afterwards
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds to wait before retrying
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._state[0] - reserve >= tokens:
+                self._state[0] -= tokens
+                return 0.0
+            return (tokens + reserve - self._state[0]) / self.rate
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Block until `tokens` can be taken from the bucket.
+
+        Returns:
+            Seconds spent waiting
+        """
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return time.monotonic() - started
+            time.sleep(wait)
+
+    @property
+    def available(self) -> float:
+        """Number of tokens currently in the bucket."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._state[0]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Anilist API Request Scheduler
+
+Shares one token bucket between priority lanes (e.g. interactive lookups and
+bulk crawls) with weighted fair queuing. Part of the bucket is reserved for
+protected lanes, and the other lanes back off while protected demand spikes.
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from rate_limit import TokenBucket
+
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Longest time a queued request sleeps before re-checking its turn.
+MAX_POLL = 1.0
+
+
+class PriorityScheduler:
+    """Dispatches requests from several priority lanes through one token bucket."""
+
+    def __init__(
+        self,
+        bucket: Optional[TokenBucket] = None,
+        weights: Optional[Dict[str, float]] = None,
+        reserved: Optional[Dict[str, float]] = None,
+        backoff_threshold: float = 0.5,
+        backoff_window: float = 10.0,
+    ):
+        """
+        Args:
+            bucket: The shared rate limit (default: a new TokenBucket)
+            weights: Share of dispatches per lane when all lanes are busy
+                (default: interactive 4, bulk 1)
+            reserved: Fraction of the bucket capacity only the given lane may use
+                (default: 20% for interactive)
+            backoff_threshold: Unreserved lanes pause while reserved lanes
+                request more than this fraction of the bucket rate (default: 0.5)
+            backoff_window: Seconds over which demand is measured and for
+                which a back-off lasts (default: 10)
+        """
+        self.bucket = bucket if bucket is not None else TokenBucket()
+        self.weights = weights if weights is not None else {INTERACTIVE: 4, BULK: 1}
+        self.reserved = reserved if reserved is not None else {INTERACTIVE: 0.2}
+        self.backoff_threshold = backoff_threshold
+        self.backoff_window = backoff_window
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, deque] = {lane: deque() for lane in self.weights}
+        self._last_finish: Dict[str, float] = {lane: 0.0 for lane in self.weights}
+        self._virtual_time = 0.0
+        self._reserved_arrivals: deque = deque()
+        self._backoff_until = 0.0
+        self._metrics: Dict[str, Dict[str, float]] = {
+            lane: {"granted": 0, "total_wait": 0.0, "max_wait": 0.0} for lane in self.weights
+        }
+
+    def _reserve_for(self, lane: str) -> float:
+        return sum(
+            fraction * self.bucket.capacity for other, fraction in self.reserved.items() if other != lane
+        )
+
+    def _lane_wait(self, lane: str, now: float) -> float:
+        """Seconds until the head of `lane` may be dispatched, ignoring other lanes."""
+        if lane not in self.reserved and now < self._backoff_until:
+            return self._backoff_until - now
+        available = self.bucket.available
+        needed = 1 + self._reserve_for(lane)
+        return max(0.0, (needed - available) / self.bucket.rate)
+
+    def _next_lane(self, now: float):
+        """Pick the lane to dispatch next: the eligible head with the earliest finish tag."""
+        heads = sorted(
+            (queue[0][0], lane) for lane, queue in self._queues.items() if queue
+        )
+        best_wait, best_lane = None, None
+        for _, lane in heads:
+            wait = self._lane_wait(lane, now)
+            if wait == 0:
+                return lane, 0.0
+            if best_wait is None or wait < best_wait:
+                best_wait, best_lane = wait, lane
+        return best_lane, best_wait
+
+    def _record_arrival(self, lane: str, now: float) -> None:
+        if lane not in self.reserved:
+            return
+        arrivals = self._reserved_arrivals
+        arrivals.append(now)
+        while arrivals and arrivals[0] < now - self.backoff_window:
+            arrivals.popleft()
+        if len(arrivals) / self.backoff_window > self.backoff_threshold * self.bucket.rate:
+            self._backoff_until = now + self.backoff_window
+
+    def acquire(self, lane: str = INTERACTIVE) -> float:
+        """
+        Block until a request in `lane` may be sent.
+
+        Returns:
+            Seconds spent queued
+        """
+        if lane not in self._queues:
+            raise ValueError(f"Unknown priority lane: {lane}")
+        arrived = time.monotonic()
+        with self._cond:
+            finish = max(self._virtual_time, self._last_finish[lane]) + 1 / self.weights[lane]
+            self._last_finish[lane] = finish
+            ticket = (finish, arrived)
+            self._queues[lane].append(ticket)
+            self._record_arrival(lane, arrived)
+            self._cond.notify_all()
+
+            while True:
+                now = time.monotonic()
+                next_lane, wait = self._next_lane(now)
+                is_head = self._queues[lane][0] is ticket
+                if next_lane == lane and is_head and wait == 0:
+                    wait = self.bucket.try_acquire(1, self._reserve_for(lane))
+                    if wait == 0:
+                        break
+                if next_lane == lane and is_head:
+                    self._cond.wait(min(wait, MAX_POLL))
+                else:
+                    self._cond.wait(MAX_POLL)
+
+            self._queues[lane].popleft()
+            self._virtual_time = max(self._virtual_time, finish)
+            waited = time.monotonic() - arrived
+            metrics = self._metrics[lane]
+            metrics["granted"] += 1
+            metrics["total_wait"] += waited
+            metrics["max_wait"] = max(metrics["max_wait"], waited)
+            self._cond.notify_all()
+        return waited
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Queue-wait metrics per lane.
+
+        Returns:
+            Dict of lane to {"granted", "queued", "avg_wait", "max_wait"}
+        """
+        with self._cond:
+            return {
+                lane: {
+                    "granted": metrics["granted"],
+                    "queued": len(self._queues[lane]),
+                    "avg_wait": metrics["total_wait"] / metrics["granted"] if metrics["granted"] else 0.0,
+                    "max_wait": metrics["max_wait"],
+                }
+                for lane, metrics in self._metrics.items()
+            }
@@ -8,7 +8,8 @@ This script shows all available keys/fields in the Anilist API responses.
 """
 
 import json
-from anilist_client import AnilistClient
+import argparse
+from daemon import get_client
 
 
 def print_nested_keys(data, prefix="", level=0):
@@ -46,9 +47,251 @@ def print_nested_keys(data, prefix="", level=0):
         print(f"{indent}{prefix}: {value_str}")
 
 
+def _type_name(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    return "object"
+
+
+class ShapeInferrer:
+    """
+    Merges many responses into one inferred schema.
+    
+    Every object and every list item is visited, so optional fields and fields
+    that only appear in later list items are found. Memory stays bounded: each
+    field keeps counters and at most `max_distinct` value hashes.
+    """
+    
+    def __init__(self, max_distinct=100):
+        """
+        Args:
+            max_distinct: Distinct values tracked per field before its
+                cardinality is reported as "at least" (default: 100)
+        """
+        self.max_distinct = max_distinct
+        self.samples = 0
+        self._objects = {}  # path -> number of objects seen at that path
+        self._fields = {}  # path -> field statistics
+    
+    def add(self, sample):
+        """Merge one response (or any JSON object) into the schema."""
+        if isinstance(sample, dict) and isinstance(sample.get("data"), dict):
+            sample = sample["data"]
+        self.samples += 1
+        self._visit(sample, "")
+    
+    def add_many(self, samples):
+        """Merge every sample of an iterable into the schema."""
+        for sample in samples:
+            self.add(sample)
+        return self
+    
+    def _visit(self, value, path):
+        if isinstance(value, dict):
+            self._objects[path] = self._objects.get(path, 0) + 1
+            for key, child in value.items():
+                child_path = f"{path}.{key}" if path else key
+                self._record(child_path, child)
+                self._visit(child, child_path)
+        elif isinstance(value, list):
+            for item in value:
+                self._visit(item, f"{path}[]")
+    
+    def _record(self, path, value):
+        field = self._fields.get(path)
+        if field is None:
+            field = self._fields[path] = {"present": 0, "types": {}, "values": set(), "capped": False}
+        type_name = _type_name(value)
+        field["types"][type_name] = field["types"].get(type_name, 0) + 1
+        if value is None or value == [] or value == "":
+            return
+        field["present"] += 1
+        
+        values = field["values"]
+        if not field["capped"] and not isinstance(value, (dict, list)):
+            values.add(hash(value))
+            if len(values) > self.max_distinct:
+                field["capped"] = True
+                values.clear()
+    
+    def schema(self):
+        """
+        Get the inferred schema.
+        
+        Returns:
+            Dict of field path to {"presence", "types", "cardinality", "cardinality_capped"},
+            where presence is the share of parent objects with a non-empty value
+        """
+        schema = {}
+        for path, field in self._fields.items():
+            parent = path.rpartition(".")[0] if "." in path else ""
+            parent_count = self._objects.get(parent, 0) or 1
+            schema[path] = {
+                "presence": field["present"] / parent_count,
+                "types": dict(field["types"]),
+                "cardinality": self.max_distinct if field["capped"] else len(field["values"]),
+                "cardinality_capped": field["capped"],
+            }
+        return schema
+    
+    def print_schema(self):
+        """Print the inferred schema as an indented field list."""
+        print(f"Inferred from {self.samples} samples")
+        for path, info in sorted(self.schema().items()):
+            name = path.rpartition(".")[2]
+            indent = "  " * path.count(".")
+            types = ", ".join(f"{name_}: {count}" for name_, count in sorted(info["types"].items()))
+            cardinality = f"{'>' if info['cardinality_capped'] else ''}{info['cardinality']}"
+            print(f"{indent}{name} ({types}) presence: {info['presence']:.0%} distinct: {cardinality}")
+    
+    def selection_set(self, min_presence=0.0):
+        """
+        Build a GraphQL selection set of the fields that are actually populated.
+        
+        Args:
+            min_presence: Minimum presence rate for a leaf field to be selected
+        
+        Returns:
+            Selection set text, e.g. `{ Media { id title { romaji } } }`
+        """
+        tree = {}
+        schema = self.schema()
+        parents = {path.rpartition(".")[0].replace("[]", "") for path in schema if "." in path}
+        for path, info in sorted(schema.items()):
+            if path.replace("[]", "") in parents or info["presence"] <= min_presence:
+                continue
+            node = tree
+            for part in path.replace("[]", "").split("."):
+                node = node.setdefault(part, {})
+        
+        def render(node):
+            return "{ " + " ".join(
+                f"{name} {render(child)}" if child else name for name, child in node.items()
+            ) + " }"
+        
+        return render(tree) if tree else "{ }"
+
+
+# Keys of the records written by crawler.py, job_queue.py and batch mode.
+OUTPUT_RECORD_KEYS = {"id", "variables", "result", "error"}
+
+
+def _is_output_record(document):
+    return (
+        isinstance(document, dict)
+        and ("result" in document or "error" in document)
+        and document.keys() <= OUTPUT_RECORD_KEYS
+    )
+
+
+def iter_json_values(f, chunk_size=64 * 1024):
+    """
+    Decode a JSON document from a text stream, yielding array items one by one.
+
+    A top-level array is decoded item by item while the stream is read in
+    chunks, so only the current item is held in memory. Any other document
+    is decoded whole and yielded as a single value.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+    
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+    
+    skip(" \t\r\n")
+    if pos >= len(buffer):
+        return
+    if buffer[pos] != "[":
+        yield json.loads(buffer[pos:] + f.read())
+        return
+    pos += 1
+    while True:
+        skip(" \t\r\n,")
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        # A value ending at the end of the buffer (e.g. a number) may continue in the next chunk.
+        if end == len(buffer) and not eof:
+            fill()
+            continue
+        pos = end
+        yield value
+
+
+def iter_samples(path):
+    """
+    Read samples from a snapshot file without loading it all at once.
+    
+    NDJSON files (.ndjson / .jsonl, optionally .gz) yield one sample per line.
+    Other files hold one JSON document or a JSON array of documents, such as
+    the paginated output of custom_query.py; arrays are decoded item by item.
+    Records written by the crawler, job queue or batch mode are unwrapped to
+    their `result`, and records of failed units (with an `error`) are skipped.
+    """
+    compressed = path.endswith('.gz')
+    if compressed:
+        import gzip
+        f = gzip.open(path, 'rt', encoding='utf-8')
+    else:
+        f = open(path, 'r', encoding='utf-8')
+    
+    with f:
+        if (path[:-3] if compressed else path).endswith(('.ndjson', '.jsonl')):
+            documents = (json.loads(line) for line in f if line.strip())
+        else:
+            documents = iter_json_values(f)
+        for document in documents:
+            if _is_output_record(document):
+                if document.get("error") or "result" not in document:
+                    continue
+                document = document["result"]
+            if document is not None:
+                yield document
+
+
+def iter_cache_samples(cache):
+    """Yield the cached results of a ResponseCache."""
+    for key in cache.store.keys():
+        entry = cache.get(key)
+        if entry is not None:
+            yield entry.data
+
+
 def explore_anime_details():
     """Explore the structure of anime details response."""
-    client = AnilistClient()
+    client = get_client()
     
     print("\n" + "=" * 50)
     print("ANIME DETAILS STRUCTURE")
@@ -68,7 +311,7 @@ def explore_anime_details():
 
 def explore_search_results():
     """Explore the structure of search results response."""
-    client = AnilistClient()
+    client = get_client()
     
     print("\n" + "=" * 50)
     print("SEARCH RESULTS STRUCTURE")
@@ -88,7 +331,7 @@ def explore_search_results():
 
 def explore_seasonal_anime():
     """Explore the structure of seasonal anime response."""
-    client = AnilistClient()
+    client = get_client()
     
     print("\n" + "=" * 50)
     print("SEASONAL ANIME STRUCTURE")
@@ -106,8 +349,30 @@ def explore_seasonal_anime():
     print_nested_keys(result["data"]["Page"])
 
 
+def infer_from_files(paths, min_presence=None):
+    """Infer and print the schema of the responses stored in snapshot files."""
+    inferrer = ShapeInferrer()
+    for path in paths:
+        inferrer.add_many(iter_samples(path))
+    inferrer.print_schema()
+    if min_presence is not None:
+        print("\nSelection set:")
+        print(inferrer.selection_set(min_presence))
+
+
 def main():
     """Main function to explore Anilist API response structure."""
+    parser = argparse.ArgumentParser(description='Explore the structure of Anilist API responses')
+    parser.add_argument('--infer', nargs='+', metavar='FILE',
+                        help='Infer a merged schema from snapshot files (JSON, NDJSON, .gz) instead of live queries')
+    parser.add_argument('--selection', type=float, metavar='MIN_PRESENCE',
+                        help='Also print a GraphQL selection set of fields populated above this rate (0-1)')
+    args = parser.parse_args()
+    
+    if args.infer:
+        infer_from_files(args.infer, args.selection)
+        return
+    
     print("Exploring Anilist API Response Structure")
     print("This script will show you the available keys/fields in the Anilist API responses.")
     
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for cache revalidation in AnilistClient against a local stub server.
+
+Run with:
+
+    python -m unittest test_revalidation
+"""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from anilist_client import AnilistClient
+from cache import ResponseCache, request_key
+from transport import HttpTransport
+
+
+QUERY = "query ($id: Int) { Media (id: $id) { id } }"
+VARIABLES = {"id": 1}
+KEY = request_key(QUERY, VARIABLES)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with the server's current body and validators."""
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server.requests.append(dict(self.headers))
+
+        etag = server.etag
+        last_modified = server.last_modified
+        not_modified = server.honour_validators and (
+            (etag and self.headers.get("If-None-Match") == etag)
+            or (last_modified and self.headers.get("If-Modified-Since") == last_modified)
+        )
+        server.statuses.append(304 if not_modified else 200)
+        self.send_response(server.statuses[-1])
+        if etag:
+            self.send_header("ETag", etag)
+        if last_modified:
+            self.send_header("Last-Modified", last_modified)
+        if not_modified:
+            self.end_headers()
+            return
+        body = json.dumps(server.body).encode("utf-8")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RevalidationTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.requests = []
+        self.server.statuses = []
+        self.server.body = {"data": {"Media": {"id": 1}}}
+        self.server.etag = '"v1"'
+        self.server.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+        self.server.honour_validators = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.cache = ResponseCache(ttl=300)
+        self.changes = []
+        self.cache.on_change(lambda key, data: self.changes.append(data))
+        self.client = AnilistClient(cache=self.cache, transport=HttpTransport())
+        self.client.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_not_modified_renews_entry(self):
+        data = self.client.run_query(QUERY, VARIABLES)
+        stored_at = self.cache.get(KEY).stored_at
+
+        result, changed = self.client.refresh(QUERY, VARIABLES)
+
+        self.assertEqual(self.server.statuses, [200, 304])
+        self.assertIs(result, data)
+        self.assertFalse(changed)
+        headers = self.server.requests[-1]
+        self.assertEqual(headers.get("If-None-Match"), '"v1"')
+        self.assertEqual(headers.get("If-Modified-Since"), "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.assertGreaterEqual(self.cache.get(KEY).stored_at, stored_at)
+        self.assertEqual(len(self.changes), 1)
+
+    def test_unchanged_body_is_not_reprocessed(self):
+        self.server.honour_validators = False
+        data = self.client.run_query(QUERY, VARIABLES)
+
+        result, changed = self.client.refresh(QUERY, VARIABLES)
+
+        self.assertEqual(self.server.statuses, [200, 200])
+        self.assertIs(result, data)
+        self.assertFalse(changed)
+
+    def test_on_change_fires_only_when_content_changes(self):
+        self.server.honour_validators = False
+        self.client.run_query(QUERY, VARIABLES)
+        self.client.refresh(QUERY, VARIABLES)
+        self.assertEqual(self.changes, [{"data": {"Media": {"id": 1}}}])
+
+        self.server.body = {"data": {"Media": {"id": 1, "episodes": 12}}}
+        self.server.etag = '"v2"'
+        result, changed = self.client.refresh(QUERY, VARIABLES)
+
+        self.assertTrue(changed)
+        self.assertEqual(result, self.server.body)
+        self.assertEqual(self.changes[-1], self.server.body)
+        self.assertEqual(len(self.changes), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
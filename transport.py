@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Anilist API Transports
+
+The layer `AnilistClient` uses to send GraphQL requests. Besides the live
+HTTP transport there is a recording transport that writes every exchange to
+an indexed archive, and a replay transport that serves an archive offline,
+either at memory speed or with the recorded latencies.
+
+Set ANILIST_RECORD=<archive> or ANILIST_REPLAY=<archive> to make every
+client (and therefore every script) record or replay without code changes.
+"""
+
+import os
+import re
+import json
+import gzip
+import mmap
+import time
+import zlib
+import random
+import struct
+import threading
+from typing import Dict, Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may record to an archive at a time.
+    fcntl = None
+
+from cache import request_key
+
+
+RECORD_ENV = "ANILIST_RECORD"
+REPLAY_ENV = "ANILIST_REPLAY"
+REPLAY_LATENCY_ENV = "ANILIST_REPLAY_LATENCY"
+
+# Frame header: metadata length, compressed body length.
+FRAME_HEADER = struct.Struct(">II")
+
+OPERATION_PATTERN = re.compile(r"^\s*(?:query|mutation)\s+(\w+)|\{\s*(\w+)")
+
+
+def operation_name(query: str) -> str:
+    """Name a query by its operation name, or by its first root field if it is anonymous."""
+    query = re.sub(r"#[^\n]*", "", query)
+    match = OPERATION_PATTERN.search(query)
+    if match is None:
+        return "unknown"
+    return match.group(1) or match.group(2)
+
+
+def _optional_module(name: str):
+    try:
+        return __import__(name)
+    except ImportError:
+        return None
+
+
+class _DeflateDecoder:
+    """
+    Streams a deflate body that may be zlib-wrapped or raw.
+
+    The spec requires zlib-wrapped data, but some servers send raw deflate,
+    so the raw format is tried when the first bytes are not a zlib header.
+    """
+
+    def __init__(self):
+        self._decompressobj = zlib.decompressobj()
+        self._buffered: Optional[bytes] = b""
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._buffered is None:
+            return self._decompressobj.decompress(data)
+        self._buffered += data
+        try:
+            decoded = self._decompressobj.decompress(data)
+        except zlib.error:
+            buffered, self._buffered = self._buffered, None
+            self._decompressobj = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decompressobj.decompress(buffered)
+        if decoded:
+            self._buffered = None
+        return decoded
+
+
+def _single_decompressor(encoding: str):
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+    if encoding == "deflate":
+        return _DeflateDecoder().decompress
+    if encoding == "br":
+        brotli = _optional_module("brotli")
+        if brotli is not None:
+            return brotli.Decompressor().process
+    if encoding == "zstd":
+        zstandard = _optional_module("zstandard")
+        if zstandard is not None:
+            return zstandard.ZstdDecompressor().decompressobj().decompress
+    raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+
+
+def _decompressor(content_encoding: str):
+    """
+    Build a streaming decompress function for a Content-Encoding, or None for identity.
+
+    Stacked encodings such as `gzip, br` list the codings in the order they
+    were applied, so they are decoded in reverse.
+    """
+    encodings = [encoding.strip().lower() for encoding in content_encoding.split(",")]
+    decoders = [
+        _single_decompressor(encoding)
+        for encoding in reversed(encodings)
+        if encoding not in ("", "identity")
+    ]
+    if not decoders:
+        return None
+    if len(decoders) == 1:
+        return decoders[0]
+
+    def decompress(data: bytes) -> bytes:
+        for decoder in decoders:
+            data = decoder(data)
+        return data
+
+    return decompress
+
+
+class TransferStats:
+    """Request and response byte counts per GraphQL operation."""
+
+    FIELDS = ("requests", "request_bytes", "request_wire_bytes", "response_wire_bytes", "response_bytes")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations: Dict[str, Dict[str, int]] = {}
+
+    def record(self, operation: str, **counts: int) -> None:
+        """Add byte counts for one exchange of `operation`."""
+        with self._lock:
+            totals = self._operations.setdefault(operation, dict.fromkeys(self.FIELDS, 0))
+            totals["requests"] += 1
+            for field, count in counts.items():
+                totals[field] += count
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get the totals per operation.
+
+        `*_wire_bytes` are the (possibly compressed) bytes sent or received,
+        `request_bytes` / `response_bytes` the sizes before compression.
+        """
+        with self._lock:
+            return {operation: dict(totals) for operation, totals in self._operations.items()}
+
+
+class HTTPError(Exception):
+    """
+    An HTTP error status returned by the API.
+
+    When `requests` is installed the raised error also derives from
+    `requests.exceptions.HTTPError`, so callers catching that keep working.
+    """
+
+    def __init__(self, status_code: int, url: str, response: Optional["TransportResponse"] = None):
+        super().__init__(f"{status_code} Error for url: {url}")
+        self.status_code = status_code
+        self.response = response
+
+
+_http_error_type = None
+
+
+def _get_http_error_type():
+    """The HTTPError class to raise, created on first use so `requests` is only imported on errors."""
+    global _http_error_type
+    if _http_error_type is None:
+        requests = _optional_module("requests")
+        if requests is None:
+            _http_error_type = HTTPError
+        else:
+            _http_error_type = type(
+                "HTTPError", (HTTPError, requests.exceptions.HTTPError), {"__module__": __name__}
+            )
+    return _http_error_type
+
+
+class ReplayMissError(KeyError):
+    """A request that is not in the replay archive."""
+
+
+class TransportResponse:
+    """A response returned by a transport."""
+
+    def __init__(
+        self,
+        status_code: int,
+        headers: Dict[str, str],
+        content: bytes,
+        elapsed: float = 0.0,
+        url: str = "",
+    ):
+        self.status_code = status_code
+        self.headers = {name.lower(): value for name, value in headers.items()}
+        self.content = content
+        self.elapsed = elapsed
+        self.url = url
+
+    def json(self) -> Dict[str, Any]:
+        """Decode the body as JSON."""
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        """Raise HTTPError for 4xx and 5xx responses."""
+        if self.status_code >= 400:
+            raise _get_http_error_type()(self.status_code, self.url, self)
+
+
+class HttpTransport:
+    """
+    Sends requests to the live API over a pooled `requests` session.
+
+    Responses are requested with every compression the environment can decode
+    (gzip and deflate, plus br and zstd when `brotli` / `zstandard` are
+    installed) and are decompressed while they stream in. Request bodies larger
+    than `compress_requests_over` bytes are sent gzip-compressed when that makes
+    them smaller. Byte counts per operation are kept in `stats`.
+    """
+
+    def __init__(self, pool_size: int = 10, compress_requests_over: Optional[int] = None):
+        """
+        Args:
+            pool_size: Maximum number of pooled connections (default: 10)
+            compress_requests_over: Request body size above which bodies are
+                gzip-compressed (default: None, never compress requests)
+        """
+        self.pool_size = pool_size
+        self.compress_requests_over = compress_requests_over
+        self.stats = TransferStats()
+        self._session = None
+        self._session_lock = threading.Lock()
+        encodings = ["gzip", "deflate"]
+        if _optional_module("brotli") is not None:
+            encodings.append("br")
+        if _optional_module("zstandard") is not None:
+            encodings.append("zstd")
+        self.accept_encoding = ", ".join(encodings)
+
+    @property
+    def session(self):
+        """
+        The HTTP session, created on first use.
+
+        `requests` is imported here rather than at module level so that
+        scripts which never reach the network (or talk to the daemon) start fast.
+        One session keeps TLS connections alive across queries.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    session.mount("https://", HTTPAdapter(pool_maxsize=self.pool_size))
+                    self._session = session
+        return self._session
+
+    def post(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> TransportResponse:
+        """Send a GraphQL payload and return the response."""
+        headers = dict(headers, **{"Accept-Encoding": self.accept_encoding})
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        request_bytes = len(body)
+        if self.compress_requests_over is not None and request_bytes > self.compress_requests_over:
+            compressed = gzip.compress(body)
+            if len(compressed) < request_bytes:
+                body = compressed
+                headers["Content-Encoding"] = "gzip"
+
+        started = time.monotonic()
+        with self.session.post(url, data=body, headers=headers, stream=True) as response:
+            decompress = _decompressor(response.headers.get("Content-Encoding", ""))
+            wire_bytes = 0
+            chunks = []
+            for chunk in response.raw.stream(64 * 1024, decode_content=False):
+                wire_bytes += len(chunk)
+                chunks.append(decompress(chunk) if decompress else chunk)
+            content = b"".join(chunks)
+            status_code = response.status_code
+            response_headers = dict(response.headers)
+        elapsed = time.monotonic() - started
+
+        self.stats.record(
+            operation_name(payload["query"]),
+            request_bytes=request_bytes,
+            request_wire_bytes=len(body),
+            response_wire_bytes=wire_bytes,
+            response_bytes=len(content),
+        )
+        return TransportResponse(status_code, response_headers, content, elapsed, url)
+
+
+class RecordingTransport:
+    """
+    Records every exchange of another transport to an archive.
+
+    The archive is a sequence of frames, each holding the JSON metadata of an
+    exchange (request, status, headers, timing) followed by the zlib-compressed
+    response body. A sidecar `<archive>.idx` NDJSON file maps request keys to
+    frame offsets. Both files are append-only, so recording can be resumed.
+    Appends are serialised with a file lock where `fcntl` is available, so
+    several processes can record to one archive.
+    """
+
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.path = path
+        self.stats = getattr(inner, "stats", None)
+        self._lock = threading.Lock()
+
+    def post(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> TransportResponse:
+        """Send a request through the inner transport and record the exchange."""
+        response = self.inner.post(url, payload, headers)
+        key = request_key(payload["query"], payload.get("variables"))
+        meta = json.dumps(
+            {
+                "key": key,
+                "url": url,
+                "payload": payload,
+                "request_headers": headers,
+                "status": response.status_code,
+                "headers": response.headers,
+                "elapsed": response.elapsed,
+                "recorded_at": time.time(),
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        body = zlib.compress(response.content)
+
+        with self._lock, open(self.path, 'ab') as archive:
+            # Other processes may record to the same archive (e.g. crawler
+            # workers), so the offset and both appends happen under a file lock.
+            if fcntl is not None:
+                fcntl.flock(archive.fileno(), fcntl.LOCK_EX)
+            try:
+                offset = archive.seek(0, os.SEEK_END)
+                archive.write(FRAME_HEADER.pack(len(meta), len(body)) + meta + body)
+                archive.flush()
+                with open(f"{self.path}.idx", 'a', encoding='utf-8') as index:
+                    index.write(json.dumps({"key": key, "offset": offset}) + "\n")
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(archive.fileno(), fcntl.LOCK_UN)
+        return response
+
+
+class ReplayTransport:
+    """
+    Serves responses from an archive written by RecordingTransport.
+
+    Requests recorded several times are answered with each recording in turn.
+    """
+
+    def __init__(self, path: str, latency: str = "none"):
+        """
+        Args:
+            path: Archive file
+            latency: "none" to answer at memory speed, "recorded" to wait as long
+                as the recorded exchange took, or "sampled" to wait for a latency
+                drawn from all recorded exchanges
+        """
+        if latency not in ("none", "recorded", "sampled"):
+            raise ValueError(f"Unknown latency mode: {latency}")
+        self.path = path
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, List[int]] = {}
+        self._next: Dict[str, int] = {}
+        with open(f"{path}.idx", 'r', encoding='utf-8') as index:
+            for line in index:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._offsets.setdefault(entry["key"], []).append(entry["offset"])
+        with open(path, 'rb') as archive:
+            # An empty file cannot be mapped; an archive with no frames replays nothing.
+            if os.fstat(archive.fileno()).st_size:
+                self._archive = mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._archive = b""
+        self._latencies = [
+            self._read_meta(offset)["elapsed"] for offsets in self._offsets.values() for offset in offsets
+        ]
+
+    def __len__(self) -> int:
+        return sum(len(offsets) for offsets in self._offsets.values())
+
+    def _read_meta(self, offset: int) -> Dict[str, Any]:
+        meta_len, _ = FRAME_HEADER.unpack_from(self._archive, offset)
+        start = offset + FRAME_HEADER.size
+        return json.loads(self._archive[start:start + meta_len])
+
+    def _read(self, offset: int) -> TransportResponse:
+        meta_len, body_len = FRAME_HEADER.unpack_from(self._archive, offset)
+        start = offset + FRAME_HEADER.size
+        meta = json.loads(self._archive[start:start + meta_len])
+        body = zlib.decompress(self._archive[start + meta_len:start + meta_len + body_len])
+        return TransportResponse(meta["status"], meta["headers"], body, meta["elapsed"], meta["url"])
+
+    def post(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> TransportResponse:
+        """Answer a request from the archive."""
+        key = request_key(payload["query"], payload.get("variables"))
+        with self._lock:
+            offsets = self._offsets.get(key)
+            if not offsets:
+                raise ReplayMissError(f"No recorded response for variables {payload.get('variables')}")
+            position = self._next.get(key, 0)
+            self._next[key] = (position + 1) % len(offsets)
+
+        response = self._read(offsets[position])
+        if self.latency == "recorded":
+            time.sleep(response.elapsed)
+        elif self.latency == "sampled" and self._latencies:
+            time.sleep(random.choice(self._latencies))
+        return response
+
+
+def transport_from_env(pool_size: int = 10):
+    """
+    Build the transport selected by the environment.
+
+    ANILIST_REPLAY selects a ReplayTransport (with ANILIST_REPLAY_LATENCY as its
+    latency mode), ANILIST_RECORD a RecordingTransport around the live API, and
+    otherwise the live HttpTransport is used.
+    """
+    replay_path = os.environ.get(REPLAY_ENV)
+    if replay_path:
+        return ReplayTransport(replay_path, os.environ.get(REPLAY_LATENCY_ENV, "none"))
+    record_path = os.environ.get(RECORD_ENV)
+    if record_path:
+        return RecordingTransport(HttpTransport(pool_size), record_path)
+    return HttpTransport(pool_size)